@@ -0,0 +1,425 @@
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+root_dir = os.path.dirname(os.path.abspath(__file__))
+
+heavy_modules = ['litellm', 'h5py', 'nltk', 'magic', 'bs4', 'pulsejet_client', 'numpy']
+
+
+def parse_import_times(stderr):
+    """
+    Parses the output of `python -X importtime` into (module, depth, self_us, cumulative_us) tuples.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(fields[0]), int(fields[1])))
+    return imports
+
+
+def benchmark_startup(config=None, live=False, repeats=5):
+    cli_path = os.path.join(root_dir, 'cli.py')
+
+    help_durations = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, cli_path, '--help'],
+                       cwd=root_dir, capture_output=True, check=True)
+        help_durations.append(time.perf_counter() - start_time)
+
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                              'import cli, chat, rag, indexing, embeddings, pulsejet_rag_client'],
+                             cwd=root_dir, capture_output=True, text=True, check=True)
+    imports = parse_import_times(process.stderr)
+    top_level = sorted((entry for entry in imports if entry[1] == 0),
+                       key=lambda entry: entry[3], reverse=True)
+    imported_names = {entry[0].split('.')[0] for entry in imports}
+    loaded_heavy_modules = [name for name in heavy_modules if name in imported_names]
+
+    metrics = {
+        'cli_help_median_seconds': statistics.median(help_durations),
+        'project_import_seconds': sum(entry[3] for entry in top_level) / 1e6,
+        'heavy_modules_loaded_at_import': loaded_heavy_modules,
+    }
+
+    print(f"`cli.py --help` median wall time over {repeats} runs: "
+          f"{metrics['cli_help_median_seconds']:.3f} seconds")
+    print(f"Importing all project modules: {metrics['project_import_seconds']:.3f} seconds")
+    print("Heaviest top-level imports:")
+    for name, _, _, cumulative_us in top_level[:10]:
+        print(f"  {name:<30} {cumulative_us / 1000:8.1f} ms")
+    if loaded_heavy_modules:
+        print(f"Heavy modules imported eagerly: {', '.join(loaded_heavy_modules)}")
+    else:
+        print("No heavy modules imported eagerly")
+    return metrics
+
+
+def time_call(func, *args, **kwargs):
+    start_time = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start_time
+
+
+def benchmark_warmup(config, live=False):
+    """
+    Compares the latency of the first RAG model request when the model is cold, when it is already
+    resident, and right after an explicit warm-up. Runs against a local stub that simulates the model
+    load delay unless `live` is set, in which case the configured Ollama server is used.
+    """
+    from ollama_client import get_ollama_client, ollama_keep_alive, warm_up
+    from ollama_stub import StubOllamaServer
+
+    stub = None
+    if not live:
+        stub = StubOllamaServer(load_delay=1.0, delay=0.05).start()
+        config = dict(config, ollama_base_url=stub.base_url)
+    client = get_ollama_client(config)
+    keep_alive = ollama_keep_alive(config)
+    model = config['main_model']
+    prompt = "In which decade did the Art Deco style emerge?"
+
+    def unload():
+        client.request('/api/generate', {'model': model, 'keep_alive': 0})
+
+    try:
+        unload()
+        cold = time_call(client.generate, model, prompt, keep_alive)
+        warm = time_call(client.generate, model, prompt, keep_alive)
+        unload()
+        warm_up_time = time_call(warm_up, config)
+        after_warm_up = time_call(client.generate, model, prompt, keep_alive)
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    metrics = {'cold_seconds': cold, 'warm_seconds': warm,
+               'warm_up_seconds': warm_up_time, 'after_warm_up_seconds': after_warm_up}
+    print(f"Server: {'Ollama at ' + client.base_url if live else 'local stub (1.0 s load delay)'}")
+    print(f"First request, cold model:        {cold:.3f} seconds")
+    print(f"Request with the model resident:  {warm:.3f} seconds")
+    print(f"Warm-up call:                     {warm_up_time:.3f} seconds")
+    print(f"First request after warm-up:      {after_warm_up:.3f} seconds")
+    return metrics
+
+
+def benchmark_client(config, live=False, calls=200):
+    """
+    Measures the per-call cost of embedding requests through litellm, through the pooled
+    OllamaClient (sequential and async concurrent) and through a new HTTP connection per call.
+    Against the local stub (zero model time) the numbers are pure client overhead.
+    """
+    import asyncio
+    import httpx
+    from ollama_client import AsyncOllamaClient, OllamaClient, ollama_base_url
+    from ollama_stub import StubOllamaServer
+
+    stub = None
+    if not live:
+        stub = StubOllamaServer(load_delay=0, delay=0).start()
+        config = dict(config, ollama_base_url=stub.base_url)
+    base_url = ollama_base_url(config)
+    model = config['embed_model']
+    text = "The Chrysler Building is an Art Deco skyscraper in Midtown Manhattan."
+
+    def per_call(func):
+        func()  # connection setup and model load are not per-call costs
+        start_time = time.perf_counter()
+        for _ in range(calls):
+            func()
+        return (time.perf_counter() - start_time) / calls
+
+    async def concurrent_calls():
+        client = AsyncOllamaClient(base_url)
+        try:
+            await client.embed(model, text)
+            start_time = time.perf_counter()
+            await asyncio.gather(*(client.embed(model, text) for _ in range(calls)))
+            return (time.perf_counter() - start_time) / calls
+        finally:
+            await client.close()
+
+    metrics = {}
+    try:
+        client = OllamaClient(base_url)
+        metrics['native_pooled'] = per_call(lambda: client.embed(model, text))
+        client.close()
+        metrics['native_new_connection'] = per_call(lambda: httpx.post(
+            base_url + '/api/embeddings', json={'model': model, 'prompt': text}).raise_for_status())
+        metrics['native_async_concurrent'] = asyncio.run(concurrent_calls())
+        try:
+            from litellm import embedding
+            metrics['litellm'] = per_call(lambda: embedding(model="ollama/" + model, input=text, api_base=base_url))
+        except ImportError:
+            print("litellm is not installed, skipping the litellm path")
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    print(f"Server: {'Ollama at ' + base_url if live else 'local stub (no model time)'}, {calls} calls each")
+    for name, seconds in metrics.items():
+        print(f"  {name:<25} {seconds * 1000:8.3f} ms per call")
+    return metrics
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[int(fraction * (len(samples) - 1))]
+
+
+def benchmark_hedging(config, live=False, requests=300, concurrency=4):
+    """
+    Tail latency of generation requests spread over three local stub replicas where 2% of requests
+    are slow, with and without hedged requests. Finally one replica starts failing, to show that it
+    is ejected and its requests are retried elsewhere. Always runs against local stubs.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from ollama_pool import OllamaPool
+    from ollama_stub import StubOllamaServer
+
+    stubs = [StubOllamaServer(load_delay=0, delay=0.02, tail_delay=0.5, tail_probability=0.02, seed=seed).start()
+             for seed in range(3)]
+    base_urls = [stub.base_url for stub in stubs]
+    model = config['main_model']
+
+    def run(pool):
+        def timed_request(_):
+            start_time = time.perf_counter()
+            pool.generate(model, "Who designed the Chrysler Building?")
+            return time.perf_counter() - start_time
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(timed_request, range(requests)))
+
+    metrics = {}
+    try:
+        for name, hedge in (('without_hedging', False), ('with_hedging', True)):
+            pool = OllamaPool(base_urls, hedge=hedge, hedge_min_delay=0.1, health_interval=0)
+            latencies = run(pool)
+            metrics[name] = {'p50': percentile(latencies, 0.5), 'p95': percentile(latencies, 0.95),
+                             'p99': percentile(latencies, 0.99), 'hedged_requests': pool.hedged_requests}
+            pool.close()
+
+        stubs[0].failing = True
+        pool = OllamaPool(base_urls, health_interval=0)
+        run(pool)
+        metrics['failover'] = {'ejected': [replica.client.base_url for replica in pool.replicas
+                                           if not replica.available]}
+        pool.close()
+    finally:
+        for stub in stubs:
+            stub.stop()
+
+    print(f"3 stub replicas, 20 ms per request, 2% of requests take 500 ms; "
+          f"{requests} requests, {concurrency} concurrent")
+    for name in ('without_hedging', 'with_hedging'):
+        result = metrics[name]
+        print(f"  {name:<16} p50={result['p50'] * 1000:6.1f} ms  p95={result['p95'] * 1000:6.1f} ms  "
+              f"p99={result['p99'] * 1000:6.1f} ms  hedged={result['hedged_requests']}")
+    print(f"  failing replica ejected: {metrics['failover']['ejected'] == [base_urls[0]]}")
+    return metrics
+
+
+def benchmark_ratelimit(config, live=False, requests=60, concurrency=8, requests_per_minute=600):
+    """
+    Cloud model calls against a local stub that allows `requests_per_minute` requests in bursts of 5
+    and answers the rest with HTTP 429 and Retry-After. Compares no retries (the old behaviour),
+    retries only, and retries with a request limit matching the stub. Always runs against the stub.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import httpx
+    from cloud_stub import StubCloudServer
+    from rate_limiter import RateLimitScheduler
+
+    messages = [{"role": "user", "content": "Who designed the Chrysler Building?"}]
+    scenarios = {
+        'no_retries': RateLimitScheduler(max_retries=0),
+        'retries': RateLimitScheduler(seed=0),
+        'retries_and_limits': RateLimitScheduler({'stub': {'requests_per_minute': requests_per_minute}}, seed=0),
+    }
+
+    # Every retry logs a warning
+    logging.getLogger('rate_limiter').setLevel(logging.ERROR)
+    metrics = {}
+    for name, scheduler in scenarios.items():
+        with StubCloudServer(requests_per_minute=requests_per_minute, burst=5) as stub, \
+                httpx.Client(base_url=stub.base_url, limits=httpx.Limits(max_connections=concurrency)) as http:
+            def call():
+                response = http.post('/v1/chat/completions', json={'model': 'stub', 'messages': messages})
+                response.raise_for_status()
+                return response.json()
+
+            def scheduled_request(_):
+                try:
+                    return scheduler.call('stub', call, usage=lambda result: result['usage']['total_tokens'])[1]
+                except httpx.HTTPStatusError:
+                    return None
+
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                timings = list(executor.map(scheduled_request, range(requests)))
+            elapsed = time.perf_counter() - start_time
+            completed = [timing for timing in timings if timing is not None]
+            metrics[name] = {
+                'completed': len(completed),
+                'failed': len(timings) - len(completed),
+                'rate_limited_responses': stub.rejected_requests,
+                'requests_per_second': len(completed) / elapsed,
+                'mean_queue_seconds': statistics.mean(t['queue_duration'] for t in completed) if completed else 0,
+                'mean_llm_seconds': statistics.mean(t['llm_duration'] for t in completed) if completed else 0,
+            }
+
+    print(f"Stub provider allowing {requests_per_minute} requests/minute in bursts of 5; "
+          f"{requests} requests, {concurrency} concurrent")
+    for name, result in metrics.items():
+        print(f"  {name:<19} completed={result['completed']:3d} failed={result['failed']:3d} "
+              f"429s={result['rate_limited_responses']:4d} {result['requests_per_second']:5.1f} req/s  "
+              f"queue={result['mean_queue_seconds'] * 1000:7.1f} ms  llm={result['mean_llm_seconds'] * 1000:5.1f} ms")
+    return metrics
+
+
+def make_synthetic_corpus(directory, text_files=200, html_files=50):
+    sentence = "The Chrysler Building is an Art Deco skyscraper in Midtown Manhattan. "
+    paths = []
+    for index in range(text_files):
+        path = os.path.join(directory, f"article_{index}.txt")
+        with open(path, 'w') as f:
+            f.write(sentence * 300)
+        paths.append(path)
+    for index in range(html_files):
+        path = os.path.join(directory, f"article_{index}.html")
+        with open(path, 'w') as f:
+            f.write("<html><body>" + f"<p>{sentence}</p>" * 1500 + "</body></html>")
+        paths.append(path)
+    return paths
+
+
+def benchmark_ingest(config, live=False):
+    """
+    Files/sec and MB/sec of reading the rag_files corpus with extension-based type dispatch and the
+    lxml parser, compared with sniffing every file with libmagic and parsing HTML with html.parser.
+    Falls back to a synthetic corpus when rag_files holds no readable documents.
+    """
+    import shutil
+    import tempfile
+    from file_utils import MIME_TYPES_BY_EXTENSION, read_text
+
+    files = [os.path.join(directory, name)
+             for directory, _, names in os.walk(config['rag_files_path']) for name in names
+             if os.path.splitext(name)[1].lower() in MIME_TYPES_BY_EXTENSION]
+    # read_text deletes files under content/ after reading them
+    files = [path for path in files if 'content/' not in os.path.abspath(path)]
+    temp_dir = None
+    if not files:
+        temp_dir = tempfile.mkdtemp()
+        files = make_synthetic_corpus(temp_dir)
+    total_megabytes = sum(os.path.getsize(path) for path in files) / 1e6
+
+    readers = {'extension dispatch + lxml': lambda path: read_text(path),
+               'extension dispatch + html.parser': lambda path: read_text(path, html_parser='html.parser')}
+    try:
+        import magic
+        readers['libmagic + html.parser'] = lambda path: read_text(
+            path, magic.from_file(path, mime=True), 'html.parser')
+    except ImportError:
+        print("python-magic is not installed, skipping the libmagic reader")
+
+    metrics = {}
+    try:
+        for name, reader in readers.items():
+            start_time = time.perf_counter()
+            for path in files:
+                reader(path)
+            elapsed = time.perf_counter() - start_time
+            metrics[name] = {'files_per_second': len(files) / elapsed, 'mb_per_second': total_megabytes / elapsed}
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir)
+
+    corpus = 'synthetic corpus' if temp_dir is not None else config['rag_files_path']
+    print(f"{len(files)} files, {total_megabytes:.1f} MB from {corpus}")
+    for name, result in metrics.items():
+        print(f"  {name:<34} {result['files_per_second']:8.1f} files/s {result['mb_per_second']:8.2f} MB/s")
+    return metrics
+
+
+def benchmark_corpus(config, live=False, articles=2000):
+    """
+    Reading the article texts of a synthetic crawl from the five-directory file tree (listdir plus
+    one open per article) compared with one sequential pass over the packed corpus shards.
+    Caches are warm for both, so the difference understates cold-cache ingest.
+    """
+    import json
+    import shutil
+    import tempfile
+    from corpus_shards import convert_tree, load_texts, shard_paths
+
+    sentence = "The Chrysler Building is an Art Deco skyscraper in Midtown Manhattan. "
+    temp_dir = tempfile.mkdtemp()
+    tree_dir = os.path.join(temp_dir, 'tree')
+    shards_dir = os.path.join(temp_dir, 'shards')
+    try:
+        for directory in ('text_files', 'url_files', 'image_files', 'reference_files', 'html_files'):
+            os.makedirs(os.path.join(tree_dir, directory))
+        for index in range(articles):
+            name = f"article_{index}"
+            files = {f'text_files/{name}.txt': sentence * 40,
+                     f'url_files/{name}.url': f"https://en.wikipedia.org/wiki/{name}",
+                     f'image_files/{name}.imgs': json.dumps([f"https://upload.wikimedia.org/{name}.jpg"]),
+                     f'reference_files/{name}.json': json.dumps({"references": [], "external_links": []}),
+                     f'html_files/{name}.html': "<html><body>" + f"<p>{sentence}</p>" * 40 + "</body></html>"}
+            for path, content in files.items():
+                with open(os.path.join(tree_dir, path), 'w') as f:
+                    f.write(content)
+
+        conversion_time = time_call(convert_tree, tree_dir, shards_dir)
+
+        def read_tree():
+            texts_path = os.path.join(tree_dir, 'text_files')
+            texts = {}
+            for file_name in os.listdir(texts_path):
+                with open(os.path.join(texts_path, file_name)) as f:
+                    texts[file_name] = f.read()
+            return texts
+
+        tree_time = time_call(read_tree)
+        shards_time = time_call(load_texts, shards_dir)
+        tree_bytes = sum(os.path.getsize(os.path.join(directory, name))
+                         for directory, _, names in os.walk(tree_dir) for name in names)
+        shard_files = os.listdir(shards_dir)
+        shards_bytes = sum(os.path.getsize(os.path.join(shards_dir, name)) for name in shard_files)
+        metrics = {'tree_files': articles * 5, 'tree_bytes': tree_bytes, 'tree_read_seconds': tree_time,
+                   'shard_files': len(shard_files), 'shards': len(shard_paths(shards_dir)),
+                   'shards_bytes': shards_bytes, 'shards_read_seconds': shards_time,
+                   'conversion_seconds': conversion_time}
+    finally:
+        shutil.rmtree(temp_dir)
+
+    print(f"{articles} synthetic articles")
+    print(f"  file tree: {metrics['tree_files']:6d} files {tree_bytes / 1e6:7.2f} MB  "
+          f"texts read in {tree_time:.3f} seconds")
+    print(f"  shards:    {metrics['shard_files']:6d} files {shards_bytes / 1e6:7.2f} MB  "
+          f"texts read in {shards_time:.3f} seconds")
+    print(f"  conversion took {conversion_time:.3f} seconds")
+    return metrics
+
+
+BENCHMARKS = {
+    'client': benchmark_client,
+    'corpus': benchmark_corpus,
+    'hedging': benchmark_hedging,
+    'ingest': benchmark_ingest,
+    'ratelimit': benchmark_ratelimit,
+    'startup': benchmark_startup,
+    'warmup': benchmark_warmup,
+}
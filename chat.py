@@ -1,50 +1,88 @@
 import os
 import time
-from litellm import completion
 import logging
 from file_utils import get_config, read_questions
-from data_saving import save_answers_json, save_answers_csv, save_answers_html, save_answers_markdown
+from data_saving import save_answers_json, save_answers_csv, save_answers_html, save_answers_markdown, \
+    save_retrieval_report
+from ollama_client import ollama_base_url, ollama_completion, ollama_keep_alive, use_native_backend, warm_up
+from rate_limiter import estimate_tokens, get_scheduler, provider_for_model
+from results_store import ResultsStore, prompt_hash
 import rag
 
 logger = logging.getLogger(__name__)
 
 
-def generate_answers(questions, config, clients):
+def generate_answers(questions, config, clients, store=None, fingerprints=None):
     answers_data = []
     total_questions = len(questions)
     for idx, question in enumerate(questions, 1):
         print(f"Processing question {idx}/{total_questions}: '{question}'")
         question_answers = {'question': question, 'answers': []}
         for model_name, client in clients.items():
+            model_hash = fingerprints.get(model_name) if fingerprints else None
+            if store is not None:
+                stored_answer = store.get(question, model_name, model_hash)
+                if stored_answer is not None:
+                    print(f"Using stored answer for {model_name}")
+                    question_answers['answers'].append(stored_answer)
+                    continue
+
             print(f"Querying {model_name}...")
             result = client(question)
             answer = result['response']
             llm_duration = max(int(result['llm_duration'] * 1000), -1)
             rag_duration = max(int(result['rag_duration'] * 1000), -1)
-            question_answers['answers'].append({'model': model_name, 'answer': answer,
-                                                'llm_duration': llm_duration, 'rag_duration': rag_duration})
+            model_answer = {'model': model_name, 'answer': answer,
+                            'llm_duration': llm_duration, 'rag_duration': rag_duration}
+            if 'queue_duration' in result:
+                # Time spent waiting for rate limits and retries, kept out of llm_duration
+                model_answer['queue_duration'] = int(result['queue_duration'] * 1000)
+            for key in ('retries', 'k', 'scores', 'prompt_length'):
+                if key in result:
+                    model_answer[key] = result[key]
+            question_answers['answers'].append(model_answer)
+            # Failed RAG calls come back with a -1 duration and must be retried on the next run
+            if store is not None and result['llm_duration'] >= 0:
+                store.put(question, model_name, model_hash, model_answer)
         answers_data.append(question_answers)
         print(f"Completed question {idx}/{total_questions}.\n")
     return answers_data
 
 
-def ask_llm(model, query):
-    base_url = None
-    if model.startswith('ollama'):
-        base_url = "http://localhost:11434"
+def set_api_keys(config):
+    os.environ["OPENAI_API_KEY"] = config['openai_key']
+    os.environ['GROQ_API_KEY'] = config['groq_key']
+
+
+def ask_llm(model, query, config=None):
+    messages = [{"role": "user", "content": query}]
+    if model.startswith('ollama/') and use_native_backend(config):
+        start_time = time.perf_counter()
+        response = ollama_completion(config, model[len('ollama/'):], messages)
+        duration = time.perf_counter() - start_time
+        return {"response": response, "llm_duration": duration, "rag_duration": -1}
 
-    start_time = time.perf_counter()
-    response = completion(
-        model=model,
-        messages=[
-            {"role": "user", "content": query},
-        ],
-        api_base=base_url
-    )
-    end_time = time.perf_counter()
-    duration = end_time - start_time
+    from litellm import completion
 
-    return {"response": response.choices[0].message.content, "llm_duration": duration, "rag_duration": -1}
+    ollama_params = {}
+    if model.startswith('ollama') and config is not None:
+        ollama_params['api_base'] = ollama_base_url(config)
+        ollama_params['keep_alive'] = ollama_keep_alive(config)
+
+    def call():
+        return completion(
+            model=model,
+            messages=messages,
+            **ollama_params
+        )
+
+    config = config or {}
+    tokens = estimate_tokens(query, config.get('expected_output_tokens', 512))
+    response, timings = get_scheduler(config).call(
+        provider_for_model(model), call, tokens, usage=lambda response: response.usage.total_tokens)
+
+    return {"response": response.choices[0].message.content, "llm_duration": timings['llm_duration'],
+            "rag_duration": -1, "queue_duration": timings['queue_duration'], "retries": timings['retries']}
 
 
 def print_and_return(result):
@@ -56,13 +94,12 @@ def print_and_return(result):
     return result
 
 
-def main():
-    config = get_config()
+def main(config=None):
+    config = config or get_config()
     file_path = config['questions_file_path']
     questions = read_questions(file_path)
 
-    os.environ["OPENAI_API_KEY"] = config['openai_key']
-    os.environ['GROQ_API_KEY'] = config['groq_key']
+    set_api_keys(config)
 
     all_models = config['all_models']
     selected_models = config['selected_models']
@@ -70,12 +107,32 @@ def main():
     clients = {}
     for model in selected_models:
         clients[model] = lambda q, m=model:  print_and_return(
-            ask_llm(all_models[m], q))
+            ask_llm(all_models[m], q, config))
     clients['ollama_rag'] = lambda q: print_and_return(
-        rag.rag(config, q))
+        rag.rag(config, q, adaptive=False))
+    adaptive_retrieval = config.get('adaptive_retrieval', False)
+    if adaptive_retrieval:
+        # Evaluated next to the fixed top-5 RAG so that the savings can be compared
+        clients['ollama_rag_adaptive'] = lambda q: print_and_return(
+            rag.rag(config, q, adaptive=True))
+
+    fingerprints = {model: prompt_hash(all_models[model]) for model in selected_models}
+    fingerprints['ollama_rag'] = prompt_hash(*rag.rag_fingerprint(config))
+    fingerprints['ollama_rag_adaptive'] = prompt_hash(*rag.rag_fingerprint(config, adaptive=True))
+
+    store_path = config.get('results_store_path',
+                            os.path.join(config['evaluation_path'], 'results_store.jsonl'))
+    store = ResultsStore(store_path)
+
+    if config.get('ollama_warm_up', True):
+        # Load the local models before timing starts, so the first question does not pay for it
+        try:
+            warm_up(config)
+        except Exception as e:
+            logger.warning(f"Ollama warm-up failed: {e}")
 
     try:
-        answers_data = generate_answers(questions, config, clients)
+        answers_data = generate_answers(questions, config, clients, store, fingerprints)
         save_answers_json(answers_data, os.path.join(
             config['evaluation_path'], 'answers.json'))
         save_answers_csv(answers_data, os.path.join(
@@ -84,8 +141,12 @@ def main():
             config['evaluation_path'], 'answers.html'))
         save_answers_markdown(answers_data, os.path.join(
             config['evaluation_path'], 'answers.md'))
+        if adaptive_retrieval:
+            save_retrieval_report(answers_data, os.path.join(
+                config['evaluation_path'], 'retrieval.md'))
     except Exception as e:
         logger.exception("An error occurred during execution:")
+        print(f"Run interrupted: {len(store)} answers are kept in {store_path}, rerun to resume.")
 
 
 if __name__ == "__main__":
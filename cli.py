@@ -0,0 +1,142 @@
+import argparse
+import os
+import runpy
+
+import benchmarks
+from file_utils import get_config
+
+# Heavy dependencies (litellm, h5py, nltk, pulsejet, ...) are imported inside the
+# subcommands so that `python cli.py ask ...` only pays for what it uses.
+
+root_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_index(args, config):
+    import indexing
+    indexing.main(config)
+
+
+def run_ask(args, config):
+    if args.model:
+        import chat
+        chat.set_api_keys(config)
+        result = chat.ask_llm(config['all_models'][args.model], args.question, config)
+    else:
+        import rag
+        result = rag.rag(config, args.question)
+    print(result['response'])
+
+
+def run_converse(args, config):
+    from conversation import ConversationSession
+    with ConversationSession(config) as session:
+        print("Ask a question, /reset to start a new conversation, an empty line to quit.")
+        while True:
+            try:
+                question = input("> ").strip()
+            except EOFError:
+                break
+            if not question:
+                break
+            if question == "/reset":
+                session.reset()
+                continue
+            turn = session.ask(question)
+            print(turn['response'])
+            if turn['llm_duration'] >= 0:
+                print(f"[{'searched' if turn['searched'] else 'reused context'}, "
+                      f"total {turn['total_duration']:.2f} s: rewrite {turn['rewrite_duration']:.2f} s, "
+                      f"embed {turn['embed_duration']:.2f} s, search {turn['rag_duration']:.2f} s, "
+                      f"LLM {turn['llm_duration']:.2f} s]")
+        print(session.latency_report())
+
+
+def run_evaluate(args, config):
+    import chat
+    chat.main(config)
+
+
+def run_crawl(args, config):
+    # wiki-bot.py is not an importable module name, so load it by path
+    wiki_bot = runpy.run_path(os.path.join(root_dir, 'wiki-bot.py'))
+    wiki_bot['main'](config)
+
+
+def run_pack(args, config):
+    from corpus_shards import convert_tree
+    source = args.source or config['rag_files_path']
+    output = args.output or config.get('corpus_shards_path', os.path.join(source, 'shards'))
+    count = convert_tree(source, output)
+    print(f"Packed {count} articles into {output}")
+
+
+def run_collections(args, config):
+    import collection_versions
+    if args.rollback:
+        version = collection_versions.rollback(config)
+        print(f"Now serving '{version}'" if version else "There is no previous version to roll back to")
+    alias = collection_versions.read_alias(config)
+    if not alias:
+        print(f"No versioned collections yet, serving '{config['pulsejet_collection_name']}'")
+        return
+    print(f"Serving:  {alias['current']}")
+    print(f"Retained: {', '.join(alias['previous']) or '-'}")
+
+
+def run_bench(args, config):
+    benchmarks.BENCHMARKS[args.name](config, live=args.live)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Art Deco RAG ChatBot")
+    parser.add_argument('--config', default="config.template.yaml",
+                        help="path of the main configuration file")
+    parser.add_argument('--secrets', default="secrets.yaml",
+                        help="path of the API keys file")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    index_parser = subparsers.add_parser('index', help="chunk, embed and insert the RAG documents")
+    index_parser.set_defaults(func=run_index)
+
+    ask_parser = subparsers.add_parser('ask', help="answer a single question")
+    ask_parser.add_argument('question')
+    ask_parser.add_argument('--model', default=None,
+                            help="ask one of all_models directly instead of using RAG")
+    ask_parser.set_defaults(func=run_ask)
+
+    converse_parser = subparsers.add_parser('converse', help="multi-turn RAG chat with per-turn latencies")
+    converse_parser.set_defaults(func=run_converse)
+
+    evaluate_parser = subparsers.add_parser('evaluate', help="answer the evaluation questions with every model")
+    evaluate_parser.set_defaults(func=run_evaluate)
+
+    crawl_parser = subparsers.add_parser('crawl', help="scrape the Art Deco articles from Wikipedia")
+    crawl_parser.set_defaults(func=run_crawl)
+
+    pack_parser = subparsers.add_parser('pack', help="convert the crawled file tree into corpus shards")
+    pack_parser.add_argument('--source', default=None, help="corpus directory (default: rag_files_path)")
+    pack_parser.add_argument('--output', default=None, help="shards directory (default: corpus_shards_path)")
+    pack_parser.set_defaults(func=run_pack)
+
+    collections_parser = subparsers.add_parser('collections', help="show the served collection version")
+    collections_parser.add_argument('--rollback', action='store_true',
+                                    help="serve the previous collection version again")
+    collections_parser.set_defaults(func=run_collections)
+
+    bench_parser = subparsers.add_parser('bench', help="run a benchmark")
+    bench_parser.add_argument('name', choices=sorted(benchmarks.BENCHMARKS))
+    bench_parser.add_argument('--live', action='store_true',
+                              help="benchmark the configured Ollama server instead of a local stub")
+    bench_parser.set_defaults(func=run_bench)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    config = get_config(args.config, args.secrets)
+    args.func(args, config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import json
+import logging
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class StubCloudServer:
+    """
+    Local stand-in for a rate limited cloud provider with an OpenAI-compatible
+    /v1/chat/completions endpoint, for testing the rate limit scheduler without API keys.
+    The stub allows `requests_per_minute` requests (in bursts of up to `burst`) and answers
+    the rest with HTTP 429 and, when `send_retry_after` is set, a Retry-After header.
+    Accepted requests take `delay` seconds.
+    """
+
+    def __init__(self, requests_per_minute=600, burst=5, delay=0.02, send_retry_after=True,
+                 host='127.0.0.1', port=0):
+        self.bucket = TokenBucket(requests_per_minute, burst)
+        self.delay = delay
+        self.send_retry_after = send_retry_after
+        self.lock = threading.Lock()
+        self.accepted_requests = 0
+        self.rejected_requests = 0
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def admit(self):
+        """Returns None if the request is allowed, otherwise the seconds until it would be."""
+        wait_time = self.bucket.reserve(1)
+        if wait_time > 0:
+            self.bucket.adjust(-1)
+            with self.lock:
+                self.rejected_requests += 1
+            return wait_time
+        with self.lock:
+            self.accepted_requests += 1
+        return None
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _send(self, status, result, headers=None):
+                body = json.dumps(result).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                if self.path.rstrip('/') != '/v1/chat/completions':
+                    self._send(404, {'error': 'not found'})
+                    return
+
+                wait_time = stub.admit()
+                if wait_time is not None:
+                    headers = {}
+                    if stub.send_retry_after:
+                        headers = {'retry-after': str(math.ceil(wait_time)),
+                                   'retry-after-ms': str(math.ceil(wait_time * 1000))}
+                    self._send(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}}, headers)
+                    return
+
+                time.sleep(stub.delay)
+                prompt_tokens = sum(len(message.get('content', '')) // 4 + 1
+                                    for message in payload.get('messages', []))
+                self._send(200, {
+                    'id': 'stub', 'object': 'chat.completion', 'model': payload.get('model', ''),
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': 'Stub answer.'}}],
+                    'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 3,
+                              'total_tokens': prompt_tokens + 3},
+                })
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+shard_suffix = re.compile(r'_shard\d+$')
+
+
+def is_version_of(config, collection):
+    """Whether `collection` is a version (or a shard of one) named by new_version_name."""
+    return re.fullmatch(rf"{re.escape(config['pulsejet_collection_name'])}_v\d{{20}}(_shard\d+)?",
+                        collection) is not None
+
+
+def alias_path(config):
+    return config.get('collection_alias_path', "collection_alias.json")
+
+
+def read_alias(config):
+    """Returns the alias file ({"current": ..., "previous": [...], "versions": {...}}) or None."""
+    path = alias_path(config)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_alias(config, alias):
+    # Readers either see the old or the new file, never a partly written one
+    path = alias_path(config)
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.collection_alias_')
+    try:
+        with os.fdopen(file_descriptor, 'w') as f:
+            json.dump(alias, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def served_collection(config):
+    """
+    The collection that queries should use: with `versioned_collections` the current version from the
+    alias file, otherwise (or before the first versioned build) `pulsejet_collection_name`.
+    """
+    if config.get('versioned_collections', False):
+        alias = read_alias(config)
+        if alias and alias.get('current'):
+            return alias['current']
+    return config['pulsejet_collection_name']
+
+
+def new_version_name(config):
+    # Microseconds keep two builds started in the same second apart
+    return f"{config['pulsejet_collection_name']}_v{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+
+
+def validate_collection(config, rag_client, embeddings_data, expected_vectors, failed_inserts=0):
+    """
+    Checks a freshly built collection before it is served: none of its inserts may have failed, it
+    must hold `expected_vectors` vectors, and searching with the embeddings of `validation_sample_size` random chunks must find the chunk
+    itself among the top 5 results for at least `validation_min_recall` of them.
+    Returns the validation stats; 'passed' tells whether the collection can be switched to.
+    """
+    sample_size = config.get('validation_sample_size', 50)
+    min_recall = config.get('validation_min_recall', 0.9)
+
+    vector_count = rag_client.vector_count()
+    chunks = [(chunk_id, embed) for file_embeddings in embeddings_data.values()
+              for chunk_id, _, embed in file_embeddings]
+    sample = random.Random(0).sample(chunks, min(sample_size, len(chunks)))
+    hits = 0
+    for chunk_id, embed in sample:
+        results = rag_client.search_similar_vectors(embed, limit=5)
+        if results and any(result.meta.get('chunk_id') == chunk_id for result in results.status.element):
+            hits += 1
+    recall = hits / len(sample) if sample else 0.0
+
+    # Not every Pulsejet version reports collection sizes; then the failed inserts tell
+    count_ok = failed_inserts == 0 and (vector_count is None or vector_count == expected_vectors)
+    stats = {'expected_vectors': expected_vectors, 'failed_inserts': failed_inserts,
+             'vector_count': vector_count, 'recall_sample_size': len(sample), 'recall': recall,
+             'passed': count_ok and bool(sample) and recall >= min_recall}
+    logger.info(f"Validation of collection '{rag_client.collection_name}': {stats}")
+    return stats
+
+
+def switch_to(config, version, validation=None):
+    """Makes `version` the served collection and returns the updated alias."""
+    alias = read_alias(config) or {'current': None, 'previous': [], 'versions': {}}
+    if alias.get('current') and alias['current'] != version:
+        alias['previous'] = [alias['current']] + [name for name in alias['previous'] if name != version]
+    alias['current'] = version
+    if validation is not None:
+        alias['versions'][version] = dict(validation, created=time.strftime('%Y-%m-%d %H:%M:%S'))
+    write_alias(config, alias)
+    logger.info(f"Now serving collection '{version}'")
+    return alias
+
+
+def rollback(config):
+    """Serves the previous version again. Returns its name, or None if there is none."""
+    alias = read_alias(config)
+    if not alias or not alias.get('previous'):
+        return None
+    version = alias['previous'][0]
+    alias['previous'] = [alias['current']] + alias['previous'][1:]
+    alias['current'] = version
+    write_alias(config, alias)
+    logger.info(f"Rolled back to collection '{version}'")
+    return version
+
+
+def garbage_collect(config):
+    """
+    Deletes the versions of `pulsejet_collection_name` that are neither served nor among the
+    `collection_versions_to_keep` most recent previous versions, including versions that failed
+    validation. Returns the names of the deleted collections.
+    """
+    from pulsejet_rag_client import connect
+
+    alias = read_alias(config)
+    if not alias:
+        return []
+    keep = config.get('collection_versions_to_keep', 2)
+    retained = {alias['current']} | set(alias['previous'][:keep])
+    alias['previous'] = alias['previous'][:keep]
+    alias['versions'] = {name: stats for name, stats in alias['versions'].items() if name in retained}
+    write_alias(config, alias)
+
+    locations = [config['pulsejet_location']]
+    if config.get('pulsejet_shards', 1) > 1:
+        locations = config.get('pulsejet_shard_locations') or locations
+    deleted = []
+    for location in locations:
+        client = connect(location)
+        try:
+            for collection in client.list_collections():
+                name = getattr(collection, 'name', collection)
+                # Only collections this module created; never other names that share the prefix
+                if is_version_of(config, name) and shard_suffix.sub('', name) not in retained:
+                    client.delete_collection(name)
+                    deleted.append(name)
+        finally:
+            client.close()
+    if deleted:
+        logger.info(f"Deleted old collection versions: {deleted}")
+    return deleted
+
+
+def publish_version(config, rag_client, embeddings_data, expected_vectors, failed_inserts=0):
+    """
+    Validates the collection `rag_client` was built into, switches the alias to it and removes
+    old versions. Raises ValueError, and keeps serving the current version, if validation fails.
+    """
+    validation = validate_collection(config, rag_client, embeddings_data, expected_vectors, failed_inserts)
+    if not validation['passed']:
+        raise ValueError(f"Collection '{rag_client.collection_name}' failed validation, "
+                         f"still serving '{served_collection(config)}': {validation}")
+    switch_to(config, rag_client.collection_name, validation)
+    validation['deleted_versions'] = garbage_collect(config)
+    return validation
@@ -0,0 +1,161 @@
+import logging
+import math
+import time
+from collections import deque
+from ollama_client import ollama_completion, ollama_embedding
+from pulsejet_rag_client import create_pulsejet_rag_client
+from rag import read_rag_prompt, retrieve, similarity
+
+logger = logging.getLogger(__name__)
+
+
+def cosine_similarity(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norms = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norms if norms > 0 else 0.0
+
+
+class ConversationSession:
+    """
+    Multi-turn RAG chat. The session keeps the last `conversation_max_turns` questions and answers
+    and a working set of retrieved chunks. Each question is first turned into a search query
+    (`conversation_rewrite`: "concat" prefixes the search query of the last search, "llm" has the
+    main model rewrite it into a standalone question, "none" uses it as is). The vector database is
+    only searched again when the embedding of the question itself (of the rewritten one with "llm")
+    has a cosine similarity below `conversation_reuse_threshold` with the query of the last search.
+    Otherwise the working set is reused, and the prompt prefix (instructions, chunks and earlier turns) stays the same, so
+    Ollama can reuse it from its KV cache.
+    """
+
+    def __init__(self, config, rag_client=None):
+        self.config = config
+        self.main_model = config['main_model']
+        self.embed_model = config['embed_model']
+        self.prompt_template = read_rag_prompt(
+            config.get('conversation_prompt_path', "evaluation/conversation_prompt.txt"))
+        self.rewrite = config.get('conversation_rewrite', "concat")
+        self.reuse_threshold = config.get('conversation_reuse_threshold', 0.8)
+        self.max_chunks = config.get('conversation_max_chunks', 8)
+        self.adaptive = config.get('adaptive_retrieval', False)
+
+        self.rag_client = rag_client or create_pulsejet_rag_client(config)
+        self.owns_client = rag_client is None
+        self.history = deque(maxlen=config.get('conversation_max_turns', 5))
+        self.working_set = []
+        self.context_embedding = None
+        self.context_query = None
+        self.turns = []
+
+    def close(self):
+        if self.owns_client:
+            self.rag_client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def reset(self):
+        self.history.clear()
+        self.working_set = []
+        self.context_embedding = None
+        self.context_query = None
+
+    def search_query(self, question):
+        if not self.history or self.rewrite == "none":
+            return question
+        if self.rewrite == "llm":
+            history = "\n".join(f"Q: {previous_question}\nA: {answer}" for previous_question, answer in self.history)
+            template = read_rag_prompt(self.config.get('rewrite_prompt_path', "evaluation/rewrite_prompt.txt"))
+            return ollama_completion(self.config, self.main_model, [
+                {"role": "user", "content": template.format(history=history, query=question)}]).strip()
+        # The query of the last search names the subject that follow-ups refer to
+        return f"{self.context_query} {question}"
+
+    def update_working_set(self, elements):
+        # New results first, then the chunks of earlier searches that were not found again
+        seen = set()
+        working_set = []
+        for result in list(elements) + self.working_set:
+            key = result.meta.get('chunk_id') or result.meta.get('content', '')
+            if key not in seen:
+                seen.add(key)
+                working_set.append(result)
+        self.working_set = working_set[:self.max_chunks]
+
+    def messages(self, question):
+        docs = "\n\n".join(result.meta.get('content', '') for result in self.working_set)
+        messages = [{"role": "system", "content": self.prompt_template.format(docs=docs)}]
+        for previous_question, answer in self.history:
+            messages.append({"role": "user", "content": previous_question})
+            messages.append({"role": "assistant", "content": answer})
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    def ask(self, question):
+        """
+        Answers the next question of the conversation. Returns the response with per-turn timings
+        in seconds: 'rewrite_duration', 'embed_duration', 'rag_duration' (search, 0 when the working
+        set was reused), 'llm_duration' and 'total_duration', plus whether the turn 'searched' and
+        the 'drift_similarity' that decided it.
+        """
+        start_time = time.perf_counter()
+        try:
+            query = self.search_query(question)
+            rewrite_end_time = time.perf_counter()
+
+            # The concatenated query contains the last search query, which would hide a topic switch
+            drift_text = question if self.rewrite == "concat" else query
+            drift_embed = ollama_embedding(self.config, self.embed_model, drift_text)
+            drift_similarity = None
+            if self.context_embedding is not None:
+                drift_similarity = cosine_similarity(drift_embed, self.context_embedding)
+            searched = drift_similarity is None or drift_similarity < self.reuse_threshold
+            query_embed = drift_embed
+            if searched and query != drift_text:
+                query_embed = ollama_embedding(self.config, self.embed_model, query)
+            embed_end_time = time.perf_counter()
+
+            if searched:
+                self.update_working_set(retrieve(self.config, self.rag_client, query_embed, self.adaptive))
+                self.context_embedding = query_embed
+                self.context_query = query
+            search_end_time = time.perf_counter()
+
+            messages = self.messages(question)
+            response = ollama_completion(self.config, self.main_model, messages)
+            end_time = time.perf_counter()
+        except Exception as e:
+            logger.error(f"Error in conversation turn: {e}")
+            return {"response": f"An error occurred: {str(e)}", "llm_duration": -1, "rag_duration": -1}
+
+        self.history.append((question, response))
+        turn = {
+            "response": response,
+            "query": query,
+            "searched": searched,
+            "drift_similarity": round(drift_similarity, 4) if drift_similarity is not None else None,
+            "k": len(self.working_set),
+            "scores": [round(similarity(result), 4) for result in self.working_set],
+            "prompt_length": sum(len(message['content']) for message in messages),
+            "rewrite_duration": rewrite_end_time - start_time,
+            "embed_duration": embed_end_time - rewrite_end_time,
+            "rag_duration": search_end_time - embed_end_time if searched else 0.0,
+            "llm_duration": end_time - search_end_time,
+            "total_duration": end_time - start_time,
+        }
+        self.turns.append(turn)
+        return turn
+
+    def latency_report(self):
+        """Mean turn latency with and without a search, and how many turns reused the working set."""
+        searched = [turn['total_duration'] for turn in self.turns if turn['searched']]
+        reused = [turn['total_duration'] for turn in self.turns if not turn['searched']]
+        return {
+            'turns': len(self.turns),
+            'searches': len(searched),
+            'reused_turns': len(reused),
+            'mean_searched_turn_seconds': sum(searched) / len(searched) if searched else None,
+            'mean_reused_turn_seconds': sum(reused) / len(reused) if reused else None,
+        }
@@ -0,0 +1,145 @@
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Layout written by wiki-bot.py when saving one file per article and data type
+tree_directories = {
+    'text': ('text_files', '.txt'),
+    'url': ('url_files', '.url'),
+    'images': ('image_files', '.imgs'),
+    'references': ('reference_files', '.json'),
+    'html': ('html_files', '.html'),
+}
+
+
+class ShardWriter:
+    """
+    Appends article records to compressed shard files in `directory`. Every record is a JSON line
+    compressed as its own gzip member, so a shard is a valid gzip file that can be read sequentially,
+    and a single record can be read by seeking to its offset. Each shard has an index file with one
+    {"name", "offset", "length"} line per record. A new shard is started once the current one
+    exceeds `max_shard_bytes`.
+    """
+
+    def __init__(self, directory, max_shard_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_shard_bytes = max_shard_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        existing_shards = sorted(glob.glob(os.path.join(directory, 'shard-*.jsonl.gz')))
+        self.shard_number = len(existing_shards) - 1 if existing_shards else 0
+        self._open_shard()
+
+    def _shard_path(self, extension):
+        return os.path.join(self.directory, f"shard-{self.shard_number:05d}{extension}")
+
+    def _open_shard(self):
+        self.data_file = open(self._shard_path('.jsonl.gz'), 'ab')
+        self.index_file = open(self._shard_path('.idx'), 'a')
+
+    def write(self, record):
+        data = gzip.compress((json.dumps(record) + '\n').encode('utf-8'))
+        with self.lock:
+            if self.data_file.tell() > 0 and self.data_file.tell() + len(data) > self.max_shard_bytes:
+                self.close()
+                self.shard_number += 1
+                self._open_shard()
+            offset = self.data_file.tell()
+            self.data_file.write(data)
+            self.data_file.flush()
+            self.index_file.write(json.dumps({'name': record['name'], 'offset': offset, 'length': len(data)}) + '\n')
+            self.index_file.flush()
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def shard_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, 'shard-*.jsonl.gz')))
+
+
+def iter_records(directory):
+    """Reads every record of every shard, in write order, with one sequential pass per shard."""
+    for path in shard_paths(directory):
+        with gzip.open(path, 'rt', encoding='utf-8') as shard:
+            for line in shard:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_record(directory, name):
+    """Reads a single record through the shard indexes. Later records with the same name win."""
+    location = None
+    for path in shard_paths(directory):
+        with open(path[:-len('.jsonl.gz')] + '.idx', 'r') as index_file:
+            for line in index_file:
+                entry = json.loads(line)
+                if entry['name'] == name:
+                    location = (path, entry['offset'], entry['length'])
+    if location is None:
+        return None
+
+    path, offset, length = location
+    with open(path, 'rb') as shard:
+        shard.seek(offset)
+        return json.loads(gzip.decompress(shard.read(length)))
+
+
+def load_texts(directory, file_extension=".txt"):
+    """
+    Returns {file name: article text} for the indexer, naming articles like the text files of the
+    file tree ("<name>.txt") so that chunk ids and precalculated embeddings stay compatible.
+    """
+    texts = {}
+    for record in iter_records(directory):
+        texts[record['name'] + file_extension] = record['text']
+    return texts
+
+
+def read_optional(path, as_json=False):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f) if as_json else f.read()
+
+
+def convert_tree(source_directory, shards_directory, max_shard_bytes=64 * 1024 * 1024):
+    """
+    Packs an existing corpus into shards. Understands both the five-directory layout written by
+    wiki-bot.py and a flat directory of .txt files. Returns the number of records written.
+    """
+    text_directory = os.path.join(source_directory, tree_directories['text'][0])
+    five_directory_layout = os.path.isdir(text_directory)
+    if not five_directory_layout:
+        text_directory = source_directory
+
+    count = 0
+    with ShardWriter(shards_directory, max_shard_bytes) as writer:
+        for file_name in sorted(os.listdir(text_directory)):
+            if not file_name.endswith('.txt'):
+                continue
+            name = file_name[:-len('.txt')]
+            record = {'name': name, 'text': read_optional(os.path.join(text_directory, file_name)),
+                      'url': None, 'images': None, 'references': None, 'html': None}
+            if five_directory_layout:
+                for key in ('url', 'images', 'references', 'html'):
+                    directory, extension = tree_directories[key]
+                    record[key] = read_optional(os.path.join(source_directory, directory, name + extension),
+                                                as_json=key in ('images', 'references'))
+            writer.write(record)
+            count += 1
+    logger.info(f"Packed {count} articles from {source_directory} into {shards_directory}")
+    return count
@@ -172,3 +172,39 @@ def escape_markdown(text):
     text = text.replace('\n', ' ')  # Replace newlines with spaces
     text = text.replace('\r', '')  # Remove carriage returns
     return text
+
+
+def save_retrieval_report(json_data, output_path, baseline_model='ollama_rag', adaptive_model='ollama_rag_adaptive'):
+    """Compares fixed top-5 RAG answers with adaptive top-k answers: chunks used, prompt size, latency."""
+    rows = []
+    for item in json_data:
+        answers = {answer['model']: answer for answer in item['answers']}
+        baseline = answers.get(baseline_model)
+        adaptive = answers.get(adaptive_model)
+        if baseline and adaptive and 'prompt_length' in baseline and 'prompt_length' in adaptive:
+            rows.append((item['question'], baseline, adaptive))
+
+    with open(output_path, 'w') as file:
+        file.write('| Question | Fixed k | Adaptive k | Adaptive Scores | Fixed Prompt Chars | Adaptive Prompt Chars '
+                   '| Fixed LLM Duration | Adaptive LLM Duration | Answer Changed |\n')
+        file.write('|' + '---|' * 9 + '\n')
+        for question, baseline, adaptive in rows:
+            changed = 'Yes' if baseline['answer'].strip() != adaptive['answer'].strip() else 'No'
+            scores = ', '.join(f"{score:.3f}" for score in adaptive['scores'])
+            file.write(f"| {escape_markdown(question)} | {baseline['k']} | {adaptive['k']} | {scores} "
+                       f"| {baseline['prompt_length']} | {adaptive['prompt_length']} "
+                       f"| {baseline['llm_duration']} ms | {adaptive['llm_duration']} ms | {changed} |\n")
+
+        if rows:
+            baseline_chars = sum(baseline['prompt_length'] for _, baseline, _ in rows)
+            adaptive_chars = sum(adaptive['prompt_length'] for _, _, adaptive in rows)
+            baseline_ms = sum(baseline['llm_duration'] for _, baseline, _ in rows)
+            adaptive_ms = sum(adaptive['llm_duration'] for _, _, adaptive in rows)
+            changed_count = sum(1 for _, baseline, adaptive in rows
+                                if baseline['answer'].strip() != adaptive['answer'].strip())
+            file.write(f"\nPrompt size saved: {baseline_chars - adaptive_chars} characters "
+                       f"({100 * (1 - adaptive_chars / baseline_chars):.1f}%)\n\n")
+            if baseline_ms > 0:
+                file.write(f"LLM latency saved: {baseline_ms - adaptive_ms} ms "
+                           f"({100 * (1 - adaptive_ms / baseline_ms):.1f}%)\n\n")
+            file.write(f"Answers changed: {changed_count} of {len(rows)}\n")
@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(content):
+    normalized = re.sub(r'\s+', ' ', content).strip().lower()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def find_near_duplicates(matrix, candidates, similarity_threshold, block_size=1024):
+    """
+    Greedy cosine-threshold clustering: walking the candidate rows in order, every row that is not
+    already an alias becomes a representative and absorbs all later rows at least
+    `similarity_threshold` similar to it. Similarities are computed block by block so that the
+    full N x N matrix is never held in memory. Returns {alias row: representative row}.
+    """
+    import numpy as np
+
+    vectors = matrix[candidates]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+
+    representative_of = {}
+    is_alias = np.zeros(len(candidates), dtype=bool)
+    for block_start in range(0, len(candidates), block_size):
+        block_end = min(block_start + block_size, len(candidates))
+        similarities = vectors[block_start:block_end] @ vectors.T
+        for offset, row in enumerate(range(block_start, block_end)):
+            if is_alias[row]:
+                continue
+            later = np.nonzero(similarities[offset, row + 1:] >= similarity_threshold)[0] + row + 1
+            later = later[~is_alias[later]]
+            is_alias[later] = True
+            for alias in later:
+                representative_of[candidates[alias]] = candidates[row]
+    return representative_of
+
+
+def deduplicate_embeddings(embeddings_data, similarity_threshold=0.98):
+    """
+    Removes exact and near-duplicate chunks from `embeddings_data` ({file name: [(chunk_id, content, embed)]}).
+    Returns the deduplicated data, a dict mapping each kept chunk_id to the chunk_ids it stands in for,
+    and statistics about the removed vectors.
+    """
+    import numpy as np
+
+    rows = [(file_name, chunk_id, content, embed)
+            for file_name, file_embeddings in embeddings_data.items()
+            for chunk_id, content, embed in file_embeddings]
+    if not rows:
+        return embeddings_data, {}, {'vectors_before': 0, 'vectors_after': 0, 'exact_duplicates': 0,
+                                     'near_duplicates': 0, 'bytes_saved': 0}
+
+    matrix = np.asarray([row[3] for row in rows], dtype=np.float32)
+
+    # Exact duplicates: identical text after whitespace and case normalization
+    representative_of = {}
+    first_row_for_hash = {}
+    for index, (_, _, content, _) in enumerate(rows):
+        digest = content_hash(content)
+        if digest in first_row_for_hash:
+            representative_of[index] = first_row_for_hash[digest]
+        else:
+            first_row_for_hash[digest] = index
+    exact_duplicates = len(representative_of)
+
+    candidates = np.array(sorted(first_row_for_hash.values()))
+    near_duplicates = find_near_duplicates(matrix, candidates, similarity_threshold)
+    representative_of.update(near_duplicates)
+
+    aliases = {}
+    for alias, representative in representative_of.items():
+        # An exact copy of a chunk that was itself merged into a near duplicate belongs to the kept chunk
+        while representative in representative_of:
+            representative = representative_of[representative]
+        aliases.setdefault(rows[representative][1], []).append(rows[alias][1])
+
+    deduplicated_data = {file_name: [] for file_name in embeddings_data}
+    bytes_saved = 0
+    for index, (file_name, chunk_id, content, embed) in enumerate(rows):
+        if index in representative_of:
+            bytes_saved += matrix.shape[1] * matrix.itemsize + len(content.encode('utf-8'))
+        else:
+            deduplicated_data[file_name].append((chunk_id, content, embed))
+
+    stats = {
+        'vectors_before': len(rows),
+        'vectors_after': len(rows) - len(representative_of),
+        'exact_duplicates': exact_duplicates,
+        'near_duplicates': len(near_duplicates),
+        'bytes_saved': bytes_saved,
+    }
+    logger.info(f"Deduplication removed {len(representative_of)} of {len(rows)} vectors "
+                f"({exact_duplicates} exact, {len(near_duplicates)} near duplicates), saving {bytes_saved} bytes")
+    return deduplicated_data, aliases, stats
@@ -3,11 +3,8 @@ import os
 import time
 import io
 import logging
-import h5py
-import numpy as np
-import tqdm
-from litellm import embedding
-from file_utils import read_text, chunk_text_by_sentences
+from file_utils import load_manifest, read_text, chunk_text_by_sentences
+from ollama_client import ollama_embedding, use_native_backend
 
 logger = logging.getLogger()
 
@@ -22,26 +19,35 @@ def silent_call(func, *args, **kwargs):
     return result
 
 
-def get_vector_size(embed_model):
-    sample_embedding = embedding(
-        model="ollama/" + embed_model, input="Sample text")['data'][0]['embedding']
-    return len(sample_embedding)
+def get_vector_size(embed_model, config=None):
+    return len(ollama_embedding(config, embed_model, "Sample text"))
 
 
-def generate_embeddings(text, embed_model):
-    return silent_call(embedding, model="ollama/" + embed_model, input=text)['data'][0]['embedding']
+def generate_embeddings(text, embed_model, silent=True, config=None):
+    # The native client does not print, so there is nothing to silence. silent_call swaps
+    # sys.stdout globally, so threaded callers silence stdout once themselves
+    if not silent or use_native_backend(config):
+        return ollama_embedding(config, embed_model, text)
+    return silent_call(ollama_embedding, config, embed_model, text)
 
 
-def create_embeddings(config, files_to_process, embed_model, sentence_per_chunk_val, overlap_val):
+def create_embeddings(config, files_to_process, embed_model, sentence_per_chunk_val, overlap_val, texts=None):
+    import h5py
+    import numpy as np
+    from tqdm import tqdm
+
     embeddings_file = config['embeddings_file_path']
     os.makedirs(os.path.dirname(embeddings_file), exist_ok=True)
 
+    manifest = load_manifest(config.get('ingest_manifest_path'))
     embeddings_data = {}
     start_time = time.time()
     with h5py.File(embeddings_file, 'w') as f:
         for file_name in tqdm(files_to_process, desc="Creating Embeddings", unit="file"):
-            file_path = os.path.join(config['rag_files_path'], file_name)
-            text = read_text(file_path)
+            if texts is not None:
+                text = texts[file_name]
+            else:
+                text = read_text(os.path.join(config['rag_files_path'], file_name), manifest.get(file_name))
             chunks = silent_call(chunk_text_by_sentences, source_text=text, sentences_per_chunk=sentence_per_chunk_val,
                                  overlap=overlap_val)
 
@@ -49,7 +55,7 @@ def create_embeddings(config, files_to_process, embed_model, sentence_per_chunk_
             contents = []
             embeddings = []
             for index, chunk in enumerate(chunks):
-                embed = generate_embeddings(chunk, embed_model)
+                embed = generate_embeddings(chunk, embed_model, config=config)
                 chunk_ids.append(f"{file_name}_{index}")
                 contents.append(chunk)
                 embeddings.append(embed)
@@ -71,7 +77,29 @@ def create_embeddings(config, files_to_process, embed_model, sentence_per_chunk_
     return embeddings_data
 
 
+def save_embeddings(config, embeddings_data):
+    import h5py
+    import numpy as np
+
+    embeddings_file = config['embeddings_file_path']
+    os.makedirs(os.path.dirname(embeddings_file), exist_ok=True)
+    with h5py.File(embeddings_file, 'w') as f:
+        for file_name, file_embeddings in embeddings_data.items():
+            chunk_ids = [chunk_id for chunk_id, _, _ in file_embeddings]
+            contents = [content for _, content, _ in file_embeddings]
+            embeddings = [embed for _, _, embed in file_embeddings]
+
+            file_group = f.create_group(file_name)
+            file_group.create_dataset('chunk_ids', data=np.array(
+                chunk_ids, dtype=h5py.special_dtype(vlen=str)))
+            file_group.create_dataset('contents', data=np.array(
+                contents, dtype=h5py.special_dtype(vlen=str)))
+            file_group.create_dataset('embeddings', data=np.array(embeddings))
+
+
 def load_embeddings(config, file_name=None):
+    import h5py
+
     try:
         embeddings_file = config['embeddings_file_path']
     except TypeError:
@@ -1,10 +1,11 @@
-import magic
+import json
+import logging
 import os
 import yaml
-from bs4 import BeautifulSoup
-from nltk import sent_tokenize
 from typing import List  # Add this import
 
+logger = logging.getLogger(__name__)
+
 
 def get_config(config_path="config.template.yaml", secrets_path="secrets.yaml"):
     with open(config_path, "r") as config_file:
@@ -24,25 +25,71 @@ def read_questions(file_path):
     return questions
 
 
-def read_text(path):
+MIME_TYPES_BY_EXTENSION = {
+    '.txt': 'text/plain',
+    '.text': 'text/plain',
+    '.md': 'text/plain',
+    '.html': 'text/html',
+    '.htm': 'text/html',
+    '.pdf': 'application/pdf',
+}
+
+
+def load_manifest(manifest_path):
+    """
+    Loads an optional JSON manifest mapping file names to MIME types, for files whose
+    extension does not tell their type.
+    """
+    if not manifest_path or not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as manifest_file:
+        return json.load(manifest_file)
+
+
+def detect_mime_type(filename, manifest=None):
+    if manifest and os.path.basename(filename) in manifest:
+        return manifest[os.path.basename(filename)]
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in MIME_TYPES_BY_EXTENSION:
+        return MIME_TYPES_BY_EXTENSION[extension]
+
+    # Sniffing the content is slow, so it is only the fallback for unknown extensions
+    import magic
+    return magic.from_file(filename, mime=True)
+
+
+def read_pdf(filename):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        logger.warning(f"Skipping PDF {filename}: install pypdf to read PDF files")
+        return ""
+    return '\n'.join(page.extract_text() or '' for page in PdfReader(filename).pages)
+
+
+def read_text(path, mime_type=None, html_parser='lxml'):
     path = path.rstrip()
     path = path.replace(' \n', '')
     path = path.replace('%0A', '')
     relative_path = path
     filename = os.path.abspath(relative_path)
 
-    filetype = magic.from_file(filename, mime=True)
+    filetype = mime_type or detect_mime_type(filename)
 
     text = ""
     if filetype == 'application/pdf':
-        print('PDF not supported yet')
-    if filetype == 'text/plain':
-        with open(filename, 'rb') as f:
-            text = f.read().decode('utf-8')
-    if filetype == 'text/html':
+        text = read_pdf(filename)
+    elif filetype == 'text/plain':
+        # Read whole: chunk_text_by_sentences tokenizes the complete text anyway
+        with open(filename, 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+    elif filetype == 'text/html':
+        from bs4 import BeautifulSoup
         with open(filename, 'rb') as f:
-            soup = BeautifulSoup(f, 'html.parser')
+            soup = BeautifulSoup(f, html_parser)
             text = soup.get_text()
+    else:
+        logger.warning(f"Skipping {filename}: unsupported file type {filetype}")
 
     if os.path.exists(filename) and filename.find('content/') > -1:
         os.remove(filename)
@@ -61,6 +108,8 @@ def chunk_text_by_sentences(source_text: str, sentences_per_chunk: int, overlap:
         raise ValueError(
             "Overlap must be 0 or more and less than the number of sentences per chunk.")
 
+    from nltk import sent_tokenize
+
     sentences = sent_tokenize(source_text, language=language)
     if not sentences:
         print("Nothing to chunk")
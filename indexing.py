@@ -1,33 +1,35 @@
 import time
 import os
 import logging
-import nltk
 import sys
 import json
-from tqdm import tqdm
-from file_utils import get_config, read_text, chunk_text_by_sentences
-from embeddings import load_embeddings, create_embeddings, generate_embeddings
+from file_utils import get_config
 from pulsejet_rag_client import create_pulsejet_rag_client
 
-# Set up logging
 log_filename = 'indexing.log'
-logging.basicConfig(level=logging.DEBUG,  # Changed to DEBUG for more detailed logs
-                    format='%(asctime)s - %(levelname)s - %(message)s',
-                    filename=log_filename,
-                    filemode='w')
 
 logger = logging.getLogger()
 
-# Silence all other loggers
-for log_name, log_obj in logging.Logger.manager.loggerDict.items():
-    if isinstance(log_obj, logging.Logger):
-        log_obj.setLevel(logging.CRITICAL)
 
-# Redirect stdout to log file
-log_file = open(log_filename, 'a')
-sys.stdout = log_file
+def setup_logging():
+    """
+    Sends all logging and stdout to the indexing log file. Returns the opened log file so that
+    stdout can be pointed back at it after progress bars are shown.
+    """
+    logging.basicConfig(level=logging.DEBUG,  # Changed to DEBUG for more detailed logs
+                        format='%(asctime)s - %(levelname)s - %(message)s',
+                        filename=log_filename,
+                        filemode='w')
 
-nltk.download('punkt', quiet=True)
+    # Silence all other loggers
+    for log_name, log_obj in logging.Logger.manager.loggerDict.items():
+        if isinstance(log_obj, logging.Logger):
+            log_obj.setLevel(logging.CRITICAL)
+
+    # Redirect stdout to log file
+    log_file = open(log_filename, 'a')
+    sys.stdout = log_file
+    return log_file
 
 
 def save_metrics(metrics, filepath):
@@ -35,10 +37,61 @@ def save_metrics(metrics, filepath):
         json.dump(metrics, f, indent=4)
 
 
-def main():
-    config = get_config()
+def index_pipelined(config, files_to_process, pj_rag_client, texts=None):
+    from tqdm import tqdm
+    from embeddings import save_embeddings
+    from pipeline import run_indexing_pipeline
+
+    print("Indexing with overlapped chunking, embedding and insertion")
+    logger.info("Indexing with overlapped chunking, embedding and insertion")
+    if config.get('deduplicate_chunks', False):
+        # Deduplication needs every embedding up front, which defeats streaming
+        logger.warning("deduplicate_chunks is ignored in pipelined indexing")
+
+    # A versioned build must never append into an existing (possibly served) collection
+    pj_rag_client.create_collection(exist_ok=not config.get('versioned_collections', False))
+    with tqdm(desc="Indexing Chunks", unit="chunk") as pbar:
+        embeddings_data, pipeline_metrics = run_indexing_pipeline(
+            config, files_to_process, pj_rag_client, progress=pbar, texts=texts)
+    save_embeddings(config, embeddings_data)
+
+    total_vectors = sum(len(file_embeddings) for file_embeddings in embeddings_data.values())
+    print(f"Total pipelined indexing time: {pipeline_metrics['total_time']:.2f} seconds")
+    for stage in ('chunk', 'embed', 'insert'):
+        stage_metrics = pipeline_metrics[stage]
+        print(f"  {stage:<6} workers={stage_metrics['workers']} "
+              f"throughput={stage_metrics['throughput_per_second']:.1f}/s "
+              f"utilization={stage_metrics['utilization']:.0%} "
+              f"max queue depth={stage_metrics['max_input_queue_depth']}")
+
+    return {
+        'embedding_method': 'pipelined generation',
+        'total_files': len(files_to_process),
+        'total_vectors': total_vectors,
+        'failed_inserts': pipeline_metrics['failed_inserts'],
+        'pipeline': pipeline_metrics,
+    }, embeddings_data
+
+
+def main(config=None):
+    import nltk
+    from tqdm import tqdm
+    from embeddings import load_embeddings, create_embeddings
+
+    log_file = setup_logging()
+    nltk.download('punkt', quiet=True)
+
+    config = config or get_config()
     logger.info(f"Configuration: {config}")
-    pj_rag_client = create_pulsejet_rag_client(config)
+    versioned = config.get('versioned_collections', False)
+    if versioned:
+        from collection_versions import new_version_name, publish_version
+
+        # Build into a new collection; queries keep using the served one until the switch
+        pj_rag_client = create_pulsejet_rag_client(config, new_version_name(config))
+        logger.info(f"Building collection version '{pj_rag_client.collection_name}'")
+    else:
+        pj_rag_client = create_pulsejet_rag_client(config, config['pulsejet_collection_name'])
     try:
         texts_path = config['rag_files_path']
         embed_model = config['embed_model']
@@ -48,8 +101,18 @@ def main():
         overlap_val = config.get('chunk_overlap', 2)
         file_extension = config.get('file_extension', ".txt")
 
-        files_to_process = [f for f in os.listdir(
-            texts_path) if f.endswith(file_extension)]
+        texts = None
+        if config.get('corpus_format', "files") == "shards" and not use_precalculated:
+            from corpus_shards import load_texts
+
+            # One sequential pass over the shards instead of a listdir and an open per article
+            shards_path = config.get('corpus_shards_path', os.path.join(texts_path, 'shards'))
+            logger.info(f"Reading corpus shards from {shards_path}")
+            texts = load_texts(shards_path, file_extension)
+            files_to_process = list(texts)
+        else:
+            files_to_process = [f for f in os.listdir(
+                texts_path) if f.endswith(file_extension)]
         total_files = len(files_to_process)
         logger.info(f"Total files to process: {total_files}")
 
@@ -58,6 +121,17 @@ def main():
 
         metrics = {}
 
+        if config.get('pipelined_indexing', False) and not use_precalculated:
+            metrics, embeddings_data = index_pipelined(config, files_to_process, pj_rag_client, texts)
+            if versioned:
+                metrics['collection_version'] = publish_version(
+                    config, pj_rag_client, embeddings_data, metrics['total_vectors'], metrics['failed_inserts'])
+            save_metrics(metrics, config['metrics_file_path'])
+            logger.info(f"Metrics saved to {config['metrics_file_path']}")
+            sys.stdout = log_file
+            logger.info(f"Indexing completed in {metrics['pipeline']['total_time']:.2f} seconds")
+            return
+
         # Step 1: Load or create embeddings
         print("Step 1: Loading or creating embeddings")
         logger.info("Step 1: Loading or creating embeddings")
@@ -73,7 +147,7 @@ def main():
             print("Generating new embeddings")
             logger.info("Generating new embeddings")
             embeddings_data = create_embeddings(
-                config, files_to_process, embed_model, sentence_per_chunk_val, overlap_val)
+                config, files_to_process, embed_model, sentence_per_chunk_val, overlap_val, texts)
             if embeddings_data is None:
                 raise ValueError(
                     "Failed to create new embeddings. Check the embedding creation process.")
@@ -88,20 +162,41 @@ def main():
         metrics['embedding_time'] = total_embedding_time
         metrics['embedding_method'] = 'loading' if use_precalculated else 'generation'
 
+        aliases = {}
+        if config.get('deduplicate_chunks', False):
+            from dedup import deduplicate_embeddings
+
+            print("\nRemoving duplicate chunks")
+            logger.info("Removing duplicate chunks")
+            start_time = time.time()
+            embeddings_data, aliases, dedup_stats = deduplicate_embeddings(
+                embeddings_data, config.get('dedup_similarity_threshold', 0.98))
+            dedup_stats['dedup_time'] = time.time() - start_time
+            print(f"Removed {dedup_stats['vectors_before'] - dedup_stats['vectors_after']} of "
+                  f"{dedup_stats['vectors_before']} vectors ({dedup_stats['exact_duplicates']} exact, "
+                  f"{dedup_stats['near_duplicates']} near duplicates), saving {dedup_stats['bytes_saved']} bytes")
+            metrics['deduplication'] = dedup_stats
+
         # Step 2: Insert embeddings into the vector database
         print("\nStep 2: Inserting embeddings into vector database")
         logger.info("Step 2: Inserting embeddings into vector database")
         start_time = time.time()
         total_vectors = 0
+        failed_inserts = 0
 
-        pj_rag_client.create_collection()
+        # A versioned build must never append into an existing (possibly served) collection
+        pj_rag_client.create_collection(exist_ok=not versioned)
         with tqdm(total=total_files, desc="Inserting Embeddings", unit="file") as pbar:
             for file_name, file_embeddings in embeddings_data.items():
                 logger.debug(f"Processing file: {file_name}")
                 for chunk_id, content, embed in file_embeddings:
                     metadata = {"filename": file_name,
                                 "chunk_id": chunk_id, "content": content}
-                    pj_rag_client.insert_vector(embed, metadata)
+                    if chunk_id in aliases:
+                        # Pulsejet metadata values are strings
+                        metadata["aliases"] = json.dumps(aliases[chunk_id])
+                    if not pj_rag_client.insert_vector(embed, metadata):
+                        failed_inserts += 1
                     total_vectors += 1
                 pbar.update(1)
         end_time = time.time()
@@ -115,9 +210,18 @@ def main():
         metrics['insertion_time'] = total_insertion_time
         metrics['total_files'] = total_files
         metrics['total_vectors'] = total_vectors
+        metrics['failed_inserts'] = failed_inserts
         metrics['average_insertion_time_per_vector'] = total_insertion_time / \
             total_vectors if total_vectors > 0 else 0
 
+        if versioned:
+            print("\nStep 3: Validating the new collection and switching to it")
+            logger.info("Step 3: Validating the new collection and switching to it")
+            validation = publish_version(config, pj_rag_client, embeddings_data, total_vectors, failed_inserts)
+            print(f"Serving '{pj_rag_client.collection_name}' ({validation['vector_count']} vectors, "
+                  f"recall {validation['recall']:.0%}); deleted old versions: {validation['deleted_versions']}")
+            metrics['collection_version'] = validation
+
         # Save metrics
         save_metrics(metrics, config['metrics_file_path'])
         logger.info(f"Metrics saved to {config['metrics_file_path']}")
@@ -0,0 +1,92 @@
+import logging
+import threading
+from types import SimpleNamespace
+
+logger = logging.getLogger(__name__)
+
+# One store per "memory:<name>" location, so that every client created for the same
+# location in this process sees the same collections (like clients of one server do).
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_local_instance(location):
+    with _instances_lock:
+        if location not in _instances:
+            _instances[location] = InMemoryPulsejetClient(location)
+        return _instances[location]
+
+
+class InMemoryPulsejetClient:
+    """
+    In-process stand-in for a Pulsejet server, used to run the RAG pipeline offline.
+    It implements the subset of the `pulsejet_client.PulsejetClient` API used by this project
+    and performs exact (brute force) search with cosine distance.
+    """
+
+    def __init__(self, location="memory"):
+        self.location = location
+        self.collections = {}
+        self.lock = threading.Lock()
+
+    def create_collection(self, collection_name, vector_config=None):
+        with self.lock:
+            if collection_name in self.collections:
+                raise ValueError(f"Collection already exists: {collection_name}")
+            self.collections[collection_name] = {'vectors': [], 'metas': []}
+        return True
+
+    def delete_collection(self, collection_name):
+        with self.lock:
+            if self.collections.pop(collection_name, None) is None:
+                raise ValueError(f"Collection not found: {collection_name}")
+        return True
+
+    def list_collections(self, filter=None):
+        with self.lock:
+            return [name for name in self.collections if not filter or filter in name]
+
+    def collection_info(self, collection_name):
+        collection = self._get_collection(collection_name)
+        return SimpleNamespace(vectors_count=len(collection['vectors']))
+
+    def insert_single(self, collection_name, vector, meta):
+        collection = self._get_collection(collection_name)
+        with self.lock:
+            collection['vectors'].append(list(vector))
+            collection['metas'].append(dict(meta or {}))
+        return True
+
+    def insert_multi(self, collection_name, vectors, metas=None):
+        metas = metas if metas is not None else [None] * len(vectors)
+        for vector, meta in zip(vectors, metas):
+            self.insert_single(collection_name, vector, meta)
+        return True
+
+    def search_single(self, collection_name, vector, limit, filter=None):
+        import numpy as np
+
+        collection = self._get_collection(collection_name)
+        with self.lock:
+            vectors = list(collection['vectors'])
+            metas = list(collection['metas'])
+
+        elements = []
+        if vectors:
+            matrix = np.asarray(vectors, dtype=np.float32)
+            query = np.asarray(vector, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+            distances = 1.0 - (matrix @ query) / np.where(norms == 0, 1.0, norms)
+            for index in np.argsort(distances)[:limit]:
+                elements.append(SimpleNamespace(id=int(index), vector=vectors[index],
+                                                distance=float(distances[index]), meta=metas[index]))
+        return SimpleNamespace(status=SimpleNamespace(element=elements))
+
+    def close(self):
+        pass
+
+    def _get_collection(self, collection_name):
+        try:
+            return self.collections[collection_name]
+        except KeyError:
+            raise ValueError(f"Collection not found: {collection_name}") from None
@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# One pooled client per server and settings, shared by every caller in the process
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def ollama_base_url(config):
+    # A single entry in ollama_endpoints is the server to use, not a pool
+    endpoints = config.get('ollama_endpoints') or []
+    if len(endpoints) == 1:
+        return endpoints[0]
+    return config.get('ollama_base_url', "http://localhost:11434")
+
+
+def ollama_keep_alive(config):
+    return config.get('ollama_keep_alive', "30m")
+
+
+def use_native_backend(config):
+    """Local Ollama models go through OllamaClient unless `ollama_backend` is "litellm"."""
+    return config is not None and config.get('ollama_backend', "native") == "native"
+
+
+def client_settings(config):
+    return {
+        'base_url': ollama_base_url(config),
+        'timeout': config.get('ollama_timeout', 300),
+        'connect_timeout': config.get('ollama_connect_timeout', 5),
+        'max_connections': config.get('ollama_max_connections', 16),
+    }
+
+
+class OllamaClient:
+    """
+    Minimal client for Ollama's REST API over a persistent pool of keep-alive HTTP connections.
+    Unlike litellm it does no per-call model/provider resolution, and it reuses TCP connections.
+    """
+
+    def __init__(self, base_url="http://localhost:11434", timeout=300, connect_timeout=5, max_connections=16):
+        import httpx
+
+        self.base_url = base_url
+        self.http = httpx.Client(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections))
+
+    def request(self, path, payload):
+        response = self.http.post(path, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def embed(self, model, text, keep_alive=None):
+        payload = {'model': model, 'prompt': text}
+        if keep_alive is not None:
+            payload['keep_alive'] = keep_alive
+        return self.request('/api/embeddings', payload)['embedding']
+
+    def chat(self, model, messages, keep_alive=None):
+        payload = {'model': model, 'messages': messages, 'stream': False}
+        if keep_alive is not None:
+            payload['keep_alive'] = keep_alive
+        return self.request('/api/chat', payload)['message']['content']
+
+    def generate(self, model, prompt, keep_alive=None):
+        payload = {'model': model, 'prompt': prompt, 'stream': False}
+        if keep_alive is not None:
+            payload['keep_alive'] = keep_alive
+        return self.request('/api/generate', payload)['response']
+
+    def close(self):
+        self.http.close()
+
+
+class AsyncOllamaClient:
+    """Asyncio variant of OllamaClient, for issuing many requests concurrently."""
+
+    def __init__(self, base_url="http://localhost:11434", timeout=300, connect_timeout=5, max_connections=16):
+        import httpx
+
+        self.base_url = base_url
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections))
+
+    async def request(self, path, payload):
+        response = await self.http.post(path, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    async def embed(self, model, text, keep_alive=None):
+        payload = {'model': model, 'prompt': text}
+        if keep_alive is not None:
+            payload['keep_alive'] = keep_alive
+        return (await self.request('/api/embeddings', payload))['embedding']
+
+    async def chat(self, model, messages, keep_alive=None):
+        payload = {'model': model, 'messages': messages, 'stream': False}
+        if keep_alive is not None:
+            payload['keep_alive'] = keep_alive
+        return (await self.request('/api/chat', payload))['message']['content']
+
+    async def generate(self, model, prompt, keep_alive=None):
+        payload = {'model': model, 'prompt': prompt, 'stream': False}
+        if keep_alive is not None:
+            payload['keep_alive'] = keep_alive
+        return (await self.request('/api/generate', payload))['response']
+
+    async def close(self):
+        await self.http.aclose()
+
+
+def pool_settings(config):
+    return {
+        'hedge': config.get('ollama_hedge', False),
+        'hedge_min_delay': config.get('ollama_hedge_min_delay', 0.5),
+        'max_failures': config.get('ollama_max_failures', 3),
+        'eject_seconds': config.get('ollama_eject_seconds', 30),
+        'health_interval': config.get('ollama_health_interval', 10),
+    }
+
+
+def get_ollama_client(config):
+    """
+    Returns the shared client for the configured Ollama server, or an OllamaPool
+    when `ollama_endpoints` lists several replicas.
+    """
+    settings = client_settings(config)
+    endpoints = config.get('ollama_endpoints') or []
+    if len(endpoints) > 1:
+        settings.pop('base_url')
+        settings.update(pool_settings(config), base_urls=tuple(endpoints))
+    key = tuple(sorted(settings.items()))
+    with _clients_lock:
+        if key not in _clients:
+            if 'base_urls' in settings:
+                from ollama_pool import OllamaPool
+                _clients[key] = OllamaPool(**settings)
+            else:
+                _clients[key] = OllamaClient(**settings)
+        return _clients[key]
+
+
+def ollama_embedding(config, model, text):
+    """Embeds text with a local Ollama model through the configured backend."""
+    if use_native_backend(config):
+        return get_ollama_client(config).embed(model, text, ollama_keep_alive(config))
+
+    from litellm import embedding
+    return embedding(model="ollama/" + model, input=text, api_base=ollama_base_url(config),
+                     keep_alive=ollama_keep_alive(config))['data'][0]['embedding']
+
+
+def ollama_completion(config, model, messages):
+    """Runs a chat completion with a local Ollama model through the configured backend."""
+    if use_native_backend(config):
+        return get_ollama_client(config).chat(model, messages, ollama_keep_alive(config))
+
+    from litellm import completion
+    return completion(model="ollama/" + model, messages=messages,
+                      api_base=ollama_base_url(config),
+                      keep_alive=ollama_keep_alive(config)).choices[0].message.content
+
+
+def warm_up(config):
+    """
+    Loads the RAG and embedding models into Ollama ahead of the first question and asks Ollama
+    to keep them resident for `ollama_keep_alive`. Returns the load time of each model in seconds
+    (the slowest replica's when there are several). Uses the same backend as the rest of the run.
+    """
+    keep_alive = ollama_keep_alive(config)
+    durations = {}
+    if not use_native_backend(config):
+        from litellm import completion, embedding
+
+        # LiteLLM cannot send a prompt-less load request, so generate a single token instead
+        start_time = time.perf_counter()
+        completion(model="ollama/" + config['main_model'], messages=[{"role": "user", "content": "Hi"}],
+                   max_tokens=1, api_base=ollama_base_url(config), keep_alive=keep_alive)
+        durations[config['main_model']] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        embedding(model="ollama/" + config['embed_model'], input="Hi", api_base=ollama_base_url(config),
+                  keep_alive=keep_alive)
+        durations[config['embed_model']] = time.perf_counter() - start_time
+
+        logger.info(f"Warmed up Ollama models through LiteLLM: {durations}")
+        return durations
+
+    client = get_ollama_client(config)
+
+    # With several replicas every one of them has to be warmed up
+    for replica_client in [replica.client for replica in getattr(client, 'replicas', [])] or [client]:
+        start_time = time.perf_counter()
+        # A generate request without a prompt only loads the model
+        replica_client.request('/api/generate', {'model': config['main_model'], 'keep_alive': keep_alive})
+        durations[config['main_model']] = max(durations.get(config['main_model'], 0),
+                                              time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        replica_client.request('/api/embeddings',
+                               {'model': config['embed_model'], 'prompt': '', 'keep_alive': keep_alive})
+        durations[config['embed_model']] = max(durations.get(config['embed_model'], 0),
+                                               time.perf_counter() - start_time)
+
+    logger.info(f"Warmed up Ollama models: {durations}")
+    return durations
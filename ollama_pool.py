@@ -0,0 +1,172 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from ollama_client import OllamaClient
+
+logger = logging.getLogger(__name__)
+
+
+def is_replica_failure(error):
+    """
+    Connection errors, timeouts and 5xx responses mean the replica is unhealthy. Other errors, like a
+    404 for an unknown model or a 400 for a bad payload, would fail on every replica alike.
+    """
+    import httpx
+
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+class Replica:
+    def __init__(self, client):
+        self.client = client
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    @property
+    def available(self):
+        return self.ejected_until <= time.monotonic()
+
+
+class OllamaPool(OllamaClient):
+    """
+    OllamaClient over several Ollama replicas. Each request goes to the available replica with the
+    fewest outstanding requests. A replica that fails `max_failures` times in a row is ejected for
+    `eject_seconds` (or until a health check sees it running again), and failed requests are retried
+    on another replica. Only connection errors, timeouts and 5xx responses count as failures; other
+    errors are raised right away. With `hedge` set, a request that has not finished after the p95
+    latency of recent requests to the same endpoint is duplicated to a second replica, and the first
+    answer wins.
+    """
+
+    def __init__(self, base_urls, timeout=300, connect_timeout=5, max_connections=16, hedge=False,
+                 hedge_min_delay=0.5, max_failures=3, eject_seconds=30, health_interval=10):
+        self.base_url = ','.join(base_urls)
+        self.replicas = [Replica(OllamaClient(base_url, timeout, connect_timeout, max_connections))
+                         for base_url in base_urls]
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.hedged_requests = 0
+        self.executor = ThreadPoolExecutor(max_workers=2 * max_connections * len(self.replicas))
+
+        self.closed = threading.Event()
+        if health_interval:
+            threading.Thread(target=self._health_loop, args=(health_interval,), daemon=True).start()
+
+    def _pick(self, exclude=()):
+        with self.lock:
+            candidates = [replica for replica in self.replicas if replica.available and replica not in exclude]
+            if not candidates:
+                # Everything is ejected: trying an ejected replica beats failing outright
+                candidates = [replica for replica in self.replicas if replica not in exclude]
+            if not candidates:
+                return None
+            fewest = min(replica.outstanding for replica in candidates)
+            replica = random.choice([replica for replica in candidates if replica.outstanding == fewest])
+            replica.outstanding += 1
+            return replica
+
+    def _hedge_delay(self, path):
+        with self.lock:
+            samples = sorted(self.latencies.get(path, ()))
+        if len(samples) < 20:
+            return self.hedge_min_delay
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    def _call(self, replica, path, payload):
+        start_time = time.perf_counter()
+        try:
+            result = replica.client.request(path, payload)
+        except Exception as e:
+            with self.lock:
+                replica.outstanding -= 1
+                if not is_replica_failure(e):
+                    raise
+                replica.consecutive_failures += 1
+                if replica.consecutive_failures >= self.max_failures:
+                    replica.ejected_until = time.monotonic() + self.eject_seconds
+                    logger.warning(
+                        f"Ejected Ollama replica {replica.client.base_url} for {self.eject_seconds} seconds")
+            raise
+        with self.lock:
+            replica.outstanding -= 1
+            replica.consecutive_failures = 0
+            self.latencies.setdefault(path, deque(maxlen=200)).append(time.perf_counter() - start_time)
+        return result
+
+    def request(self, path, payload):
+        tried = []
+        last_error = None
+        while len(tried) < len(self.replicas):
+            replica = self._pick(tried)
+            tried.append(replica)
+            try:
+                if self.hedge and len(self.replicas) > 1:
+                    return self._hedged_call(replica, tried, path, payload)
+                return self._call(replica, path, payload)
+            except Exception as e:
+                if not is_replica_failure(e):
+                    raise
+                logger.warning(f"Request to Ollama replica {replica.client.base_url} failed: {e}")
+                last_error = e
+        raise last_error
+
+    def _hedged_call(self, replica, tried, path, payload):
+        futures = [self.executor.submit(self._call, replica, path, payload)]
+        done, _ = wait(futures, timeout=self._hedge_delay(path))
+        if not done:
+            backup = self._pick(tried)
+            if backup is not None:
+                tried.append(backup)
+                with self.lock:
+                    self.hedged_requests += 1
+                futures.append(self.executor.submit(self._call, backup, path, payload))
+
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The slower duplicate keeps running; its answer is discarded
+                    return future.result()
+                error = future.exception()
+                if not is_replica_failure(error):
+                    raise error
+        raise error
+
+    def check_health(self):
+        for replica in self.replicas:
+            try:
+                replica.client.http.get('/', timeout=2).raise_for_status()
+                healthy = True
+            except Exception:
+                healthy = False
+            with self.lock:
+                if healthy and not replica.available:
+                    logger.info(f"Ollama replica {replica.client.base_url} is healthy again")
+                    replica.ejected_until = 0.0
+                    replica.consecutive_failures = 0
+                elif not healthy and replica.available:
+                    logger.warning(f"Ollama replica {replica.client.base_url} failed its health check")
+                    replica.ejected_until = time.monotonic() + self.eject_seconds
+
+    def _health_loop(self, interval):
+        while not self.closed.wait(interval):
+            self.check_health()
+
+    def close(self):
+        self.closed.set()
+        # Let in-flight hedged duplicates finish before their HTTP clients are closed
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for replica in self.replicas:
+            replica.client.close()
@@ -0,0 +1,144 @@
+import json
+import logging
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+def parse_keep_alive(keep_alive, default=300.0):
+    """Converts an Ollama keep_alive value ("30m", "10s", "1h", 300, -1) into seconds."""
+    if keep_alive is None:
+        return default
+    if isinstance(keep_alive, (int, float)):
+        return float('inf') if keep_alive < 0 else float(keep_alive)
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if keep_alive[-1] in units:
+        return float(keep_alive[:-1]) * units[keep_alive[-1]]
+    return float(keep_alive)
+
+
+class StubOllamaServer:
+    """
+    Local stand-in for an Ollama server, for benchmarks that must run without a GPU.
+    The first request for a model (or the first one after its keep_alive expired) pays
+    `load_delay` seconds, like Ollama loading the weights. Every request also pays `delay`
+    seconds (generation time) and gets a fixed answer or a deterministic embedding.
+    A `tail_probability` fraction of requests takes `tail_delay` seconds instead, and while
+    `failing` is set every request fails with HTTP 500.
+    """
+
+    def __init__(self, load_delay=1.0, delay=0.05, embedding_size=8, host='127.0.0.1', port=0,
+                 tail_delay=0.0, tail_probability=0.0, seed=None):
+        self.load_delay = load_delay
+        self.delay = delay
+        self.tail_delay = tail_delay
+        self.tail_probability = tail_probability
+        self.random = random.Random(seed)
+        self.failing = False
+        self.embedding_size = embedding_size
+        self.loaded_until = {}
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _use_model(self, model, keep_alive):
+        with self.lock:
+            self.request_count += 1
+            loaded = self.loaded_until.get(model, 0) > time.monotonic()
+        if not loaded:
+            time.sleep(self.load_delay)
+        with self.lock:
+            self.loaded_until[model] = time.monotonic() + parse_keep_alive(keep_alive)
+
+    def _embedding(self, text):
+        seed = zlib.crc32(text.encode('utf-8'))
+        return [((seed >> index) % 1000) / 1000.0 for index in range(self.embedding_size)]
+
+    def handle(self, path, payload):
+        model = payload.get('model', '')
+        if path == '/api/generate' and not payload.get('prompt') and \
+                parse_keep_alive(payload.get('keep_alive')) == 0:
+            # keep_alive=0 without a prompt unloads the model
+            with self.lock:
+                self.loaded_until.pop(model, None)
+            return {'model': model, 'response': '', 'done': True, 'done_reason': 'unload'}
+        self._use_model(model, payload.get('keep_alive'))
+
+        if path == '/api/generate' and not payload.get('prompt'):
+            # An empty prompt only loads the model, which is how Ollama clients preload models
+            return {'model': model, 'response': '', 'done': True}
+        with self.lock:
+            slow = self.random.random() < self.tail_probability
+        time.sleep(self.tail_delay if slow else self.delay)
+        if path == '/api/generate':
+            return {'model': model, 'response': 'Stub answer.', 'done': True}
+        if path == '/api/chat':
+            return {'model': model, 'message': {'role': 'assistant', 'content': 'Stub answer.'}, 'done': True}
+        if path == '/api/embeddings':
+            return {'embedding': self._embedding(payload.get('prompt', ''))}
+        if path == '/api/embed':
+            inputs = payload.get('input', '')
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            return {'model': model, 'embeddings': [self._embedding(text) for text in inputs]}
+        return None
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately; without this, delayed ACKs add ~40 ms per request
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                if stub.failing:
+                    result, status = {'error': 'stub failure'}, 500
+                else:
+                    result = stub.handle(self.path, payload)
+                    status = 200 if result is not None else 404
+                body = json.dumps(result if result is not None else {'error': 'not found'}).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                body = b'Ollama is running' if not stub.failing else b'stub failure'
+                self.send_response(200 if not stub.failing else 500)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
@@ -0,0 +1,199 @@
+import contextlib
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from file_utils import load_manifest, read_text, chunk_text_by_sentences
+from embeddings import generate_embeddings
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class Stage:
+    """
+    A pool of worker threads that takes items from `in_queue`, applies `func` (which returns a list
+    of output items) and puts the outputs on `out_queue`. When the input is exhausted the last
+    worker to finish passes one end marker per downstream worker.
+    """
+
+    def __init__(self, name, func, workers, in_queue, out_queue, stop_event):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.stop_event = stop_event
+        self.downstream_workers = 0
+
+        self.lock = threading.Lock()
+        self.running_workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_time = 0.0
+        self.start_time = None
+        self.end_time = None
+        self.error = None
+        self.queue_depths = []
+        self.threads = [threading.Thread(target=self._work, name=f"{name}-{index}", daemon=True)
+                        for index in range(workers)]
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        for thread in self.threads:
+            thread.start()
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+    def _put(self, item):
+        # A bounded queue whose consumer failed would otherwise block forever
+        while not self.stop_event.is_set():
+            try:
+                self.out_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _work(self):
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    item = self.in_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+
+                start_time = time.perf_counter()
+                outputs = self.func(item)
+                with self.lock:
+                    self.busy_time += time.perf_counter() - start_time
+                    self.items_in += 1
+                    self.items_out += len(outputs)
+                for output in outputs:
+                    self._put(output)
+        except Exception as e:
+            logger.exception(f"Error in pipeline stage '{self.name}':")
+            self.error = e
+            self.stop_event.set()
+        finally:
+            with self.lock:
+                self.running_workers -= 1
+                last_worker = self.running_workers == 0
+            if last_worker:
+                self.end_time = time.perf_counter()
+                if self.out_queue is not None:
+                    for _ in range(self.downstream_workers):
+                        self._put(_DONE)
+
+    def metrics(self):
+        elapsed = (self.end_time or time.perf_counter()) - self.start_time
+        return {
+            'workers': self.workers,
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'busy_time': self.busy_time,
+            'elapsed_time': elapsed,
+            'throughput_per_second': self.items_in / elapsed if elapsed > 0 else 0,
+            'utilization': self.busy_time / (elapsed * self.workers) if elapsed > 0 else 0,
+            'avg_input_queue_depth': sum(self.queue_depths) / len(self.queue_depths) if self.queue_depths else 0,
+            'max_input_queue_depth': max(self.queue_depths, default=0),
+        }
+
+
+def run_indexing_pipeline(config, files_to_process, rag_client, progress=None, texts=None):
+    """
+    Reads/chunks, embeds and inserts the files concurrently, with bounded queues between the stages,
+    so that indexing takes about as long as the slowest stage instead of the sum of all of them.
+    Returns the embeddings data (in the format of `create_embeddings`) and per-stage metrics,
+    including the number of 'failed_inserts'.
+    With `texts` ({file name: text}, e.g. from corpus shards) no files are read.
+    """
+    embed_model = config['embed_model']
+    sentences_per_chunk = config.get('sentences_per_chunk', 10)
+    overlap = config.get('chunk_overlap', 2)
+    workers = {'chunk': 2, 'embed': 4, 'insert': 2}
+    workers.update(config.get('pipeline_workers') or {})
+    queue_size = config.get('pipeline_queue_size', 256)
+
+    file_queue = queue.Queue()
+    chunk_queue = queue.Queue(maxsize=queue_size)
+    embed_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+
+    results_lock = threading.Lock()
+    results = {file_name: [] for file_name in files_to_process}
+    failed_inserts = 0
+
+    manifest = load_manifest(config.get('ingest_manifest_path'))
+
+    def chunk_file(file_name):
+        if texts is not None:
+            text = texts[file_name]
+        else:
+            text = read_text(os.path.join(config['rag_files_path'], file_name), manifest.get(file_name))
+        chunks = chunk_text_by_sentences(source_text=text, sentences_per_chunk=sentences_per_chunk,
+                                         overlap=overlap)
+        return [(file_name, index, chunk) for index, chunk in enumerate(chunks)]
+
+    def embed_chunk(item):
+        file_name, index, chunk = item
+        embed = generate_embeddings(chunk, embed_model, silent=False, config=config)
+        return [(file_name, index, chunk, embed)]
+
+    def insert_chunk(item):
+        nonlocal failed_inserts
+        file_name, index, chunk, embed = item
+        chunk_id = f"{file_name}_{index}"
+        metadata = {"filename": file_name, "chunk_id": chunk_id, "content": chunk}
+        inserted = rag_client.insert_vector(embed, metadata)
+        with results_lock:
+            results[file_name].append((index, chunk_id, chunk, embed))
+            if not inserted:
+                failed_inserts += 1
+        if progress is not None:
+            progress.update(1)
+        return []
+
+    stages = [
+        Stage('chunk', chunk_file, workers['chunk'], file_queue, chunk_queue, stop_event),
+        Stage('embed', embed_chunk, workers['embed'], chunk_queue, embed_queue, stop_event),
+        Stage('insert', insert_chunk, workers['insert'], embed_queue, None, stop_event),
+    ]
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage.downstream_workers = next_stage.workers
+
+    for file_name in files_to_process:
+        file_queue.put(file_name)
+    for _ in range(stages[0].workers):
+        file_queue.put(_DONE)
+
+    start_time = time.perf_counter()
+    # chunking and litellm print to stdout; silence it once for all worker threads
+    with contextlib.redirect_stdout(io.StringIO()):
+        for stage in stages:
+            stage.start()
+        while any(thread.is_alive() for stage in stages for thread in stage.threads):
+            for stage in stages:
+                stage.queue_depths.append(stage.in_queue.qsize())
+            time.sleep(0.1)
+        for stage in stages:
+            stage.join()
+    total_time = time.perf_counter() - start_time
+
+    for stage in stages:
+        if stage.error is not None:
+            raise RuntimeError(f"Indexing pipeline stage '{stage.name}' failed") from stage.error
+
+    embeddings_data = {file_name: [(chunk_id, chunk, embed) for _, chunk_id, chunk, embed in sorted(
+        file_results, key=lambda result: result[0])] for file_name, file_results in results.items()}
+    metrics = {'total_time': total_time, 'failed_inserts': failed_inserts}
+    for stage in stages:
+        metrics[stage.name] = stage.metrics()
+        logger.info(f"Pipeline stage '{stage.name}': {metrics[stage.name]}")
+    return embeddings_data, metrics
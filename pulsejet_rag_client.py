@@ -1,45 +1,83 @@
-import pulsejet_client as pj
 import logging
-from embeddings import get_vector_size
 
 logger = logging.getLogger(__name__)
 
 
+def is_local_location(location):
+    location = location['location'] if isinstance(location, dict) else location
+    return location.startswith('memory')
+
+
+def connect(location):
+    """
+    Opens a Pulsejet client for a location, which is either a `pulsejet_location` string or
+    a dict of `PulsejetClient` keyword arguments (e.g. {location: remote, host: 10.0.0.2}).
+    Locations starting with "memory" use the in-process stand-in from `local_vector_store`.
+    """
+    client_kwargs = dict(location) if isinstance(location, dict) else {'location': location}
+    if is_local_location(location):
+        from local_vector_store import get_local_instance
+        return get_local_instance(client_kwargs['location'])
+
+    import pulsejet_client as pj
+    return pj.PulsejetClient(**client_kwargs)
+
+
 class PulsejetRagClient:
-    def __init__(self, config):
+    def __init__(self, config, collection_name=None, location=None):
         self.config = config
-        self.collection_name = config['pulsejet_collection_name']
+        self.collection_name = collection_name or config['pulsejet_collection_name']
         self.main_model = config['main_model']
         self.embed_model = config['embed_model']
-        self.client = pj.PulsejetClient(location=config['pulsejet_location'])
+        self.location = location or config['pulsejet_location']
+        self.client = connect(self.location)
 
-    def create_collection(self):
+    def create_collection(self, vector_size=None, exist_ok=True):
+        """
+        Creates the collection. Errors (such as the collection already existing) are only logged,
+        unless `exist_ok` is False, which a build that must start from an empty collection needs.
+        """
         logger.info(f"Creating collection for RAG using Pulsejet")
 
-        vector_size = get_vector_size(self.config['embed_model'])
-        vector_params = pj.VectorParams(
-            size=vector_size, index_type=pj.IndexType.HNSW)
+        from embeddings import get_vector_size
+
+        vector_size = vector_size or get_vector_size(self.config['embed_model'], self.config)
+        vector_params = self.vector_params(vector_size)
 
         try:
             self.client.create_collection(self.collection_name, vector_params)
             logger.info(f"Created new collection: {self.collection_name}")
         except Exception as e:
+            if not exist_ok:
+                raise
             logger.info(
                 f"Collection '{self.collection_name}' already exists or error occurred: {str(e)}")
 
+    def vector_params(self, vector_size):
+        if is_local_location(self.location):
+            return {'size': vector_size}
+
+        import pulsejet_client as pj
+        return pj.VectorParams(size=vector_size, index_type=pj.IndexType.HNSW)
+
     def insert_vector(self, vector, metadata=None):
+        """Inserts a vector. Failures are logged; returns whether the insert succeeded."""
         try:
             self.client.insert_single(self.collection_name, vector, metadata)
             logger.debug(f"Inserted vector with metadata: {metadata}")
+            return True
         except Exception as e:
             logger.error(f"Error inserting vector: {str(e)}")
+            return False
 
     def insert_vectors(self, vectors, metadatas=None):
         try:
             self.client.insert_multi(self.collection_name, vectors, metadatas)
             logger.debug(f"Inserted {len(vectors)} vectors")
+            return True
         except Exception as e:
             logger.error(f"Error inserting multiple vectors: {str(e)}")
+            return False
 
     def search_similar_vectors(self, query_vector, limit=5):
         try:
@@ -50,6 +88,14 @@ class PulsejetRagClient:
             logger.error(f"Error searching for similar vectors: {str(e)}")
             return []
 
+    def vector_count(self):
+        """Number of vectors in the collection, or None if the server does not report it."""
+        try:
+            return self.client.collection_info(self.collection_name).vectors_count
+        except Exception as e:
+            logger.warning(f"Could not get the size of collection '{self.collection_name}': {str(e)}")
+            return None
+
     def get_client_dict(self):
         return {
             'db': self.client,
@@ -66,5 +112,14 @@ class PulsejetRagClient:
             logger.error(f"Error closing Pulsejet client connection: {str(e)}")
 
 
-def create_pulsejet_rag_client(config):
-    return PulsejetRagClient(config)
+def create_pulsejet_rag_client(config, collection_name=None):
+    """
+    Client for `collection_name`, by default the served collection (see `collection_versions`).
+    """
+    if collection_name is None:
+        from collection_versions import served_collection
+        collection_name = served_collection(config)
+    if config.get('pulsejet_shards', 1) > 1:
+        from sharded_rag_client import ShardedRagClient
+        return ShardedRagClient(config, collection_name)
+    return PulsejetRagClient(config, collection_name)
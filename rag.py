@@ -1,6 +1,6 @@
 import time
-from litellm import completion, embedding
 import logging
+from ollama_client import ollama_completion, ollama_embedding
 from pulsejet_rag_client import create_pulsejet_rag_client
 
 logger = logging.getLogger(__name__)
@@ -11,32 +11,83 @@ def read_rag_prompt(file_path):
         return file.read().strip()
 
 
-def rag(config, query):
+def rag_fingerprint(config, adaptive=False):
+    """Everything in the config that changes what the RAG pipeline answers."""
+    from collection_versions import served_collection
+
+    # The served version changes with every versioned reindex, which invalidates stored answers
+    fingerprint = (config['main_model'], config['embed_model'], served_collection(config),
+                   config.get('sentences_per_chunk', 10), config.get('chunk_overlap', 2),
+                   read_rag_prompt(config['rag_prompt_path']))
+    if adaptive:
+        fingerprint += (config.get('retrieval_candidates', 10), config.get('retrieval_max_k', 5),
+                        config.get('retrieval_min_similarity', 0.0), config.get('retrieval_max_score_gap'))
+    return fingerprint
+
+
+def similarity(result):
+    # Pulsejet returns cosine distances
+    return 1.0 - result.distance
+
+
+def select_results(results, max_k=5, min_similarity=0.0, max_score_gap=None):
+    """
+    Cuts a list of search results (best first) to the ones worth putting in the prompt. The best
+    result is always kept; the list is cut at the first result below `min_similarity`, at the first
+    result whose similarity dropped by more than `max_score_gap` (relative) from the previous one,
+    and after `max_k` results.
+    """
+    selected = results[:1]
+    for previous, result in zip(results, results[1:max_k]):
+        score = similarity(result)
+        if score < min_similarity:
+            break
+        previous_score = similarity(previous)
+        if max_score_gap is not None and previous_score > 0 and \
+                (previous_score - score) / previous_score > max_score_gap:
+            break
+        selected.append(result)
+    return selected
+
+
+def retrieve(config, rag_client, query_embed, adaptive=False):
+    """Searches the vector database and returns the results to put in the prompt, best first."""
+    if adaptive:
+        # Over-fetch, then keep only the candidates that are likely to matter
+        results = rag_client.search_similar_vectors(
+            query_embed, limit=config.get('retrieval_candidates', 10))
+        return select_results(list(results.status.element),
+                              max_k=config.get('retrieval_max_k', 5),
+                              min_similarity=config.get('retrieval_min_similarity', 0.0),
+                              max_score_gap=config.get('retrieval_max_score_gap'))
+    results = rag_client.search_similar_vectors(query_embed, limit=5)
+    return list(results.status.element)
+
+
+def rag(config, query, adaptive=None):
     rag_client = create_pulsejet_rag_client(config)
     main_model = config['main_model']
     embed_model = config['embed_model']
     rag_prompt_template = read_rag_prompt(config['rag_prompt_path'])
+    if adaptive is None:
+        adaptive = config.get('adaptive_retrieval', False)
 
     start_time = time.time()
 
     try:
-        query_embed = embedding(
-            model="ollama/" + embed_model, input=query)['data'][0]['embedding']
+        query_embed = ollama_embedding(config, embed_model, query)
 
         rag_start_time = time.time()
-        results = rag_client.search_similar_vectors(query_embed, limit=5)
+        elements = retrieve(config, rag_client, query_embed, adaptive)
         rag_end_time = time.time()
 
         relevant_docs = [result.meta.get('content', '')
-                         for result in results.status.element]
+                         for result in elements]
         docs = "\n\n".join(relevant_docs)
 
         model_query = rag_prompt_template.format(query=query, docs=docs)
-        response = completion(
-            model="ollama/" + main_model,
-            messages=[{"role": "user", "content": model_query}],
-            api_base="http://localhost:11434"
-        ).choices[0].message.content
+        response = ollama_completion(
+            config, main_model, [{"role": "user", "content": model_query}])
 
         end_time = time.time()
 
@@ -44,7 +95,9 @@ def rag(config, query):
         total_duration = end_time - start_time
         llm_duration = total_duration - rag_duration
 
-        return {"response": response, "llm_duration": llm_duration, "rag_duration": rag_duration}
+        return {"response": response, "llm_duration": llm_duration, "rag_duration": rag_duration,
+                "k": len(elements), "scores": [round(similarity(result), 4) for result in elements],
+                "prompt_length": len(model_query)}
     except Exception as e:
         logger.error(f"Error in RAG process: {e}")
         return {"response": f"An error occurred: {str(e)}", "llm_duration": -1, "rag_duration": -1}
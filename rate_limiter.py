@@ -0,0 +1,222 @@
+import email.utils
+import json
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: rate limited, or the provider is temporarily overloaded
+retryable_status_codes = (429, 500, 502, 503, 504)
+
+# One scheduler per rate limit settings, shared by every caller in the process
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `per_minute` tokens per minute, holding at most `burst`
+    tokens (a full minute's worth by default). `reserve` always takes the tokens, possibly going
+    into debt, and returns how long the caller has to wait before using them. Callers are thereby
+    served in arrival order without polling, and requests larger than the bucket are still paced.
+    """
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount=1):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount):
+        """Takes (or with a negative amount gives back) tokens after the fact, e.g. for actual usage."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class ProviderLimits:
+    """
+    Request and token buckets of one provider. Providers enforce their per minute limits over much
+    shorter windows, so the buckets only hold `burst_seconds` worth of requests and tokens.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, burst_seconds=1.0):
+        self.requests = None
+        self.tokens = None
+        if requests_per_minute:
+            self.requests = TokenBucket(requests_per_minute, max(1.0, requests_per_minute * burst_seconds / 60))
+        if tokens_per_minute:
+            self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute * burst_seconds / 60)
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def block(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def blocked_for(self):
+        with self.lock:
+            return max(0.0, self.blocked_until - time.monotonic())
+
+
+def provider_for_model(model):
+    """LiteLLM model ids are "<provider>/<model>", except for OpenAI models which have no prefix."""
+    return model.split('/', 1)[0] if '/' in model else 'openai'
+
+
+def estimate_tokens(text, expected_output_tokens=0):
+    # About four characters per token for English text
+    return len(text) // 4 + 1 + expected_output_tokens
+
+
+def status_code(error):
+    code = getattr(error, 'status_code', None)
+    if code is None and getattr(error, 'response', None) is not None:
+        code = getattr(error.response, 'status_code', None)
+    return code
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, from the Retry-After(-ms) header of the error, if any."""
+    headers = getattr(error, 'litellm_response_headers', None)
+    if headers is None and getattr(error, 'response', None) is not None:
+        headers = getattr(error.response, 'headers', None)
+    if not headers:
+        return None
+
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class RateLimitScheduler:
+    """
+    Runs provider calls within per-provider request and token per minute limits, and retries calls
+    that fail with a rate limit or overload status. A Retry-After from the provider pauses every
+    call to that provider for that long, and the rejected call retries at a random time between
+    one and two Retry-After periods later. Without one, the delay grows exponentially from
+    `base_delay` up to `max_delay`, with full jitter. Either way concurrent callers do not retry
+    in lockstep.
+    """
+
+    def __init__(self, limits=None, max_retries=6, base_delay=1.0, max_delay=60.0, seed=None):
+        self.limits = {provider: ProviderLimits(settings.get('requests_per_minute'),
+                                                settings.get('tokens_per_minute'),
+                                                settings.get('burst_seconds', 1.0))
+                       for provider, settings in (limits or {}).items()}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.rate_limited_responses = 0
+
+    def _provider_limits(self, provider):
+        with self.lock:
+            if provider not in self.limits:
+                self.limits[provider] = ProviderLimits()
+            return self.limits[provider]
+
+    def backoff_delay(self, attempt, retry_after=None):
+        with self.lock:
+            if retry_after is not None:
+                return retry_after + self.random.uniform(0, retry_after)
+            return self.random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, provider, func, tokens=0, usage=None):
+        """
+        Calls `func()` once the limits of `provider` allow it, retrying retryable failures.
+        `tokens` is the estimated token count of the call; with `usage(result)` returning the actual
+        count, the token bucket is corrected afterwards. Returns the result and a dict with the
+        time spent waiting ('queue_duration', including failed attempts), the latency of the
+        successful call ('llm_duration') and the number of 'retries'.
+        """
+        limits = self._provider_limits(provider)
+        start_time = time.perf_counter()
+        attempt = 0
+        while True:
+            wait_time = 0.0
+            if limits.requests is not None:
+                wait_time = max(wait_time, limits.requests.reserve(1))
+            if limits.tokens is not None and tokens:
+                wait_time = max(wait_time, limits.tokens.reserve(tokens))
+            time.sleep(wait_time)
+            while limits.blocked_for() > 0:
+                time.sleep(limits.blocked_for())
+
+            call_start = time.perf_counter()
+            try:
+                result = func()
+            except Exception as e:
+                code = status_code(e)
+                if code not in retryable_status_codes or attempt >= self.max_retries:
+                    raise
+                if limits.tokens is not None and tokens:
+                    # Rejected calls do not use up the provider's tokens
+                    limits.tokens.adjust(-tokens)
+                if code == 429:
+                    with self.lock:
+                        self.rate_limited_responses += 1
+                requested_delay = retry_after(e)
+                if requested_delay is not None:
+                    limits.block(requested_delay)
+                delay = self.backoff_delay(attempt, requested_delay)
+                attempt += 1
+                logger.warning(f"{provider} returned HTTP {code}, retry {attempt}/{self.max_retries} "
+                               f"in {delay:.2f} seconds")
+                time.sleep(delay)
+                continue
+
+            llm_duration = time.perf_counter() - call_start
+            if usage is not None and limits.tokens is not None:
+                try:
+                    limits.tokens.adjust(usage(result) - tokens)
+                except (AttributeError, KeyError, TypeError):
+                    pass  # the provider did not report usage
+            queue_duration = time.perf_counter() - start_time - llm_duration
+            return result, {'queue_duration': queue_duration, 'llm_duration': llm_duration, 'retries': attempt}
+
+
+def scheduler_settings(config):
+    return {
+        'limits': config.get('rate_limits') or {},
+        'max_retries': config.get('rate_limit_max_retries', 6),
+        'base_delay': config.get('rate_limit_base_delay', 1.0),
+        'max_delay': config.get('rate_limit_max_delay', 60.0),
+    }
+
+
+def get_scheduler(config):
+    """Returns the shared scheduler for the configured `rate_limits`."""
+    settings = scheduler_settings(config)
+    key = json.dumps(settings, sort_keys=True)
+    with _schedulers_lock:
+        if key not in _schedulers:
+            _schedulers[key] = RateLimitScheduler(**settings)
+        return _schedulers[key]
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_hash(*parts):
+    """
+    Returns a short, stable hash of everything that determines a model's answer
+    (model id, prompt template, retrieval parameters, ...).
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+class ResultsStore:
+    """
+    Append-only JSONL store of evaluation answers keyed by (question, model, prompt hash).
+    Every answer is flushed to disk as soon as it is recorded, so an interrupted run
+    can be resumed without querying the completed pairs again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r') as file:
+            for line_number, line in enumerate(file, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash while writing can leave a truncated last line behind
+                    logger.warning(
+                        f"Skipping unreadable line {line_number} in results store: {self.path}")
+                    continue
+                key = (record['question'], record['model'], record['prompt_hash'])
+                self.results[key] = record['result']
+        logger.info(f"Loaded {len(self.results)} stored results from {self.path}")
+
+    def get(self, question, model, prompt_hash):
+        return self.results.get((question, model, prompt_hash))
+
+    def put(self, question, model, prompt_hash, result):
+        self.results[(question, model, prompt_hash)] = result
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        record = {'question': question, 'model': model,
+                  'prompt_hash': prompt_hash, 'result': result}
+        with open(self.path, 'a') as file:
+            file.write(json.dumps(record) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    def __len__(self):
+        return len(self.results)
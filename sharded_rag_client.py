@@ -0,0 +1,91 @@
+import heapq
+import logging
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from pulsejet_rag_client import PulsejetRagClient
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for_filename(file_name, shard_count):
+    # crc32 instead of hash(): it has to give the same shard in every process
+    return zlib.crc32(file_name.encode('utf-8')) % shard_count
+
+
+def merge_search_results(shard_results, limit):
+    """
+    Merges per-shard top-k results into the global top-k, keeping the
+    `results.status.element` shape of a single Pulsejet search response.
+    """
+    elements = []
+    for results in shard_results:
+        # search_similar_vectors returns [] when a shard search fails
+        if results:
+            elements.extend(results.status.element)
+    top_elements = heapq.nsmallest(limit, elements, key=lambda element: element.distance)
+    return SimpleNamespace(status=SimpleNamespace(element=top_elements))
+
+
+class ShardedRagClient:
+    """
+    Drop-in replacement for PulsejetRagClient that partitions chunks across
+    `pulsejet_shards` collections by filename hash; vectors without a filename go to shard 0.
+    Shard i is the collection "<pulsejet_collection_name>_shard<i>" at
+    `pulsejet_shard_locations[i % len(locations)]`.
+    Searches run on all shards in parallel and the results are merged.
+    """
+
+    def __init__(self, config, collection_name=None):
+        self.config = config
+        self.collection_name = collection_name or config['pulsejet_collection_name']
+        shard_count = config.get('pulsejet_shards', 1)
+        locations = config.get('pulsejet_shard_locations') or [config['pulsejet_location']]
+
+        self.shards = [PulsejetRagClient(config,
+                                         collection_name=f"{self.collection_name}_shard{index}",
+                                         location=locations[index % len(locations)])
+                       for index in range(shard_count)]
+        self.executor = ThreadPoolExecutor(max_workers=shard_count)
+
+    def shard_index(self, metadata):
+        # Vectors without a filename cannot be placed by it, so they all go to the first shard
+        if not metadata or 'filename' not in metadata:
+            return 0
+        return shard_for_filename(metadata['filename'], len(self.shards))
+
+    def create_collection(self, vector_size=None, exist_ok=True):
+        from embeddings import get_vector_size
+
+        vector_size = vector_size or get_vector_size(self.config['embed_model'], self.config)
+        for shard in self.shards:
+            shard.create_collection(vector_size, exist_ok)
+
+    def insert_vector(self, vector, metadata=None):
+        return self.shards[self.shard_index(metadata)].insert_vector(vector, metadata)
+
+    def insert_vectors(self, vectors, metadatas=None):
+        if metadatas is None:
+            return self.shards[0].insert_vectors(vectors)
+        batches = {}
+        for vector, metadata in zip(vectors, metadatas):
+            shard_vectors, shard_metadatas = batches.setdefault(self.shard_index(metadata), ([], []))
+            shard_vectors.append(vector)
+            shard_metadatas.append(metadata)
+        # Every shard gets its batch, even after another shard failed
+        return all([self.shards[index].insert_vectors(shard_vectors, shard_metadatas)
+                    for index, (shard_vectors, shard_metadatas) in batches.items()])
+
+    def search_similar_vectors(self, query_vector, limit=5):
+        futures = [self.executor.submit(shard.search_similar_vectors, query_vector, limit)
+                   for shard in self.shards]
+        return merge_search_results([future.result() for future in futures], limit)
+
+    def vector_count(self):
+        counts = [shard.vector_count() for shard in self.shards]
+        return None if None in counts else sum(counts)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        for shard in self.shards:
+            shard.close()
@@ -17,10 +17,6 @@ def safe_filename(url):
     return re.sub(r'[-\s]+', '_', safe_name.strip())
 
 
-# Set up logging
-logging.basicConfig(filename='wiki_bot_log.txt',
-                    level=logging.INFO, format='%(asctime)s - %(message)s')
-
 wikipedia_base_url = 'https://en.wikipedia.org'
 
 
@@ -104,7 +100,11 @@ def get_buildings_from_listing_pages(listing):
     return selected_hrefs
 
 
-def fetch_and_save_article(url, output_folder):
+def fetch_and_save_article(url, output_folder, shard_writer=None):
+    """
+    Saves the article text, URL, image URLs, references and HTML, either as five files in five
+    directories under `output_folder` or, with a `shard_writer`, as one record of a corpus shard.
+    """
     try:
         response = requests.get(url)
         response.raise_for_status()
@@ -156,6 +156,12 @@ def fetch_and_save_article(url, output_folder):
         article_text = '\n'.join(collected_texts)
         base_filename = safe_filename(url)
 
+        if shard_writer is not None:
+            shard_writer.write({'name': base_filename, 'text': article_text, 'url': url,
+                                'images': image_urls, 'references': data, 'html': response.text})
+            logging.info(f"Processed and saved shard record for URL: {url}")
+            return
+
         # Define directories for different file types
         directories = {
             'text': 'text_files',
@@ -200,8 +206,12 @@ def fetch_and_save_article(url, output_folder):
         logging.error(f"Failed to fetch {url}: {e}")
 
 
-if __name__ == "__main__":
-    config = get_config()
+def main(config=None):
+    # Set up logging
+    logging.basicConfig(filename='wiki_bot_log.txt',
+                        level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    config = config or get_config()
 
     download_path = config['rag_files_path']
     if not os.path.exists(download_path):
@@ -217,12 +227,23 @@ if __name__ == "__main__":
     building_urls1 = get_buildings_from_main_page(main_listing_url)
     building_urls2 = get_buildings_from_listing_pages(listings)
     buildings = set(building_urls1).union(building_urls2)
+    shard_writer = None
+    if config.get('corpus_format', "files") == "shards":
+        from corpus_shards import ShardWriter
+        shard_writer = ShardWriter(config.get('corpus_shards_path', os.path.join(download_path, 'shards')))
+
     pbar = tqdm(total=len(buildings), desc="Starting processing",
                 bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}] {postfix}')
     for building in buildings:
         pbar.set_postfix_str(f"Processing URL: {building}")
         fetch_and_save_article(
-            urljoin(wikipedia_base_url, building), download_path)
+            urljoin(wikipedia_base_url, building), download_path, shard_writer)
         pbar.update(1)
     pbar.close()
+    if shard_writer is not None:
+        shard_writer.close()
     print('All articles have been processed and saved.')
+
+
+if __name__ == "__main__":
+    main()